@@ -0,0 +1,79 @@
+"""Attachment upload stage for invoices and bills."""
+
+import base64
+import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# A multiple of 3, so base64 encoded chunks concatenate into a valid value.
+CHUNK_SIZE = 3 * 256 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+
+class Base64FileStream:
+    """Base64 encoding of a file, produced chunk by chunk.
+
+    Used with `OdooSession.execute_kw_streamed`: `placeholder` goes in the
+    payload and is replaced on the wire by the encoded file content.
+    """
+
+    placeholder = "__target_odoo_v3_stream__"
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.length = 4 * ((self.size + 2) // 3)
+
+    def __iter__(self):
+        # Re-opened on every iteration so a retried request can resend it.
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield base64.b64encode(chunk)
+
+
+class AttachmentUploader:
+    """Runs uploads on a thread pool, capping the bytes in flight.
+
+    `submit` blocks while starting another upload would exceed
+    `max_inflight_bytes`, unless nothing is in flight (a single file larger
+    than the cap is still uploaded, on its own).
+    """
+
+    def __init__(
+        self, max_workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES
+    ):
+        self.max_inflight_bytes = max_inflight_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="attachments"
+        )
+        self._inflight = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self, size):
+        with self._condition:
+            while self._inflight and self._inflight + size > self.max_inflight_bytes:
+                self._condition.wait()
+            self._inflight += size
+
+    def _release(self, size):
+        with self._condition:
+            self._inflight -= size
+            self._condition.notify_all()
+
+    def submit(self, size, func, *args):
+        self._acquire(size)
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._release(size)
+            raise
+        future.add_done_callback(lambda _: self._release(size))
+        return future
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,272 @@
+"""Run-wide lookup caches for Odoo reference data."""
+
+import threading
+
+PREFETCH_CHUNK_SIZE = 1000
+
+# Fields read by lookups when the caller doesn't ask for specific ones. Full
+# records pull every stored, computed and binary field, which dominates
+# response size and parse time.
+DEFAULT_FIELDS = {
+    "account.account": ["id", "name", "code"],
+    "account.move": ["id", "name", "ref", "move_type", "partner_id", "state"],
+    "account.tax": ["id", "name", "amount", "amount_type", "type_tax_use"],
+    "account.tax.group": ["id", "name"],
+    "product.product": ["id", "name"],
+    "res.country": ["id", "name", "code"],
+    "res.currency": ["id", "name"],
+    "res.partner": [
+        "id",
+        "name",
+        "company_type",
+        "email",
+        "phone",
+        "street",
+        "street2",
+        "city",
+        "country_id",
+        "company_name",
+    ],
+}
+
+
+def default_fields(model):
+    """Return the default projection of `model`, None for every field."""
+    fields = DEFAULT_FIELDS.get(model)
+    return list(fields) if fields else None
+
+
+class LookupIndex:
+    """Cache of `search_read` results for one model, keyed by lookup field.
+
+    Every `(field, value)` pair resolved once is remembered, including misses,
+    so repeated lookups never go back to Odoo. `prefetch` resolves many values
+    with a single `in` query.
+    """
+
+    def __init__(self, session, model, fields=None, persist=False):
+        self.session = session
+        self.model = model
+        self.fields = fields or default_fields(model)
+        # Only reference data is kept in the persistent store between runs.
+        self.store = session.store if persist else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._keys = set()
+        self._lock = threading.RLock()
+        # Records of the keys resolved by earlier runs, read from the store
+        # on first use and restored as batches look them up.
+        self._stored = None
+
+    @staticmethod
+    def normalize(field, value):
+        if field == "id":
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return value
+        return value
+
+    def _search(self, domain):
+        kwargs = None
+        if self.fields:
+            fields = list(self.fields)
+            if self.store is not None:
+                fields.append("write_date")
+            kwargs = {"fields": fields}
+        return self.session.execute_kw(self.model, "search_read", [domain], kwargs)
+
+    def _load_stored(self):
+        store = self.store
+        store.expire(self.model)
+        records = store.records(self.model)
+        self._stored = {}
+        by_field = {}
+        for field, value in store.lookups(self.model):
+            if field not in by_field:
+                by_field[field] = {}
+                for record in records:
+                    by_field[field].setdefault(record.get(field), []).append(record)
+            self._stored[(field, value)] = list(by_field[field].get(value, []))
+
+    def _seed(self, field, values):
+        """Restore `values` resolved by earlier runs from the persistent store.
+
+        Only the stored rows of these values are checked for changes since
+        the last sync, not every row of the model changed in the tenant.
+        Stored misses and rows no longer matching are looked up again.
+        """
+        if self._stored is None:
+            self._load_stored()
+        keys = [(field, v) for v in values if self._stored.get((field, v))]
+        if not keys:
+            return
+        ids = sorted({record["id"] for key in keys for record in self._stored[key]})
+        changed = {}
+        for start in range(0, len(ids), PREFETCH_CHUNK_SIZE):
+            chunk = ids[start : start + PREFETCH_CHUNK_SIZE]
+            for record in self.store.refresh_rows(
+                self.model, self._search, [["id", "in", chunk]]
+            ):
+                changed[record["id"]] = record
+        for key in keys:
+            records = [changed.get(r["id"], r) for r in self._stored.pop(key)]
+            if all(self.normalize(field, r.get(field)) == key[1] for r in records):
+                self._keys.add(field)
+                self._entries[key] = records
+
+    def prefetch(self, field, values):
+        with self._lock:
+            missing = {
+                self.normalize(field, value)
+                for value in values
+                if value not in (None, "", False)
+            }
+            missing = [v for v in missing if (field, v) not in self._entries]
+            if missing and self.store is not None:
+                self._seed(field, missing)
+                missing = [v for v in missing if (field, v) not in self._entries]
+        if not missing:
+            return
+        records = []
+        for start in range(0, len(missing), PREFETCH_CHUNK_SIZE):
+            chunk = missing[start : start + PREFETCH_CHUNK_SIZE]
+            records.extend(self._search([[field, "in", chunk]]))
+        if self.store is not None:
+            self.store.save_lookups(self.model, field, missing, records)
+        with self._lock:
+            self._keys.add(field)
+            for value in missing:
+                self._entries[(field, value)] = []
+            for record in records:
+                entry = self._entries.get((field, record.get(field)))
+                if entry is not None:
+                    entry.append(record)
+
+    def get(self, field, value):
+        key = (field, self.normalize(field, value))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        self.prefetch(field, [value])
+        with self._lock:
+            return self._entries.get(key, [])
+
+    def add(self, record):
+        """Add a record created during the run to every already cached key."""
+        with self._lock:
+            for field in self._keys:
+                key = (field, self.normalize(field, record.get(field)))
+                entry = self._entries.get(key)
+                if entry is not None and record not in entry:
+                    entry.append(record)
+
+
+class ModelIndex(LookupIndex):
+    """Lookup index that loads the whole model on first use.
+
+    Meant for small, rarely changing models such as the chart of accounts:
+    lookups on any of `keys` are answered from memory after a single
+    `search_read`.
+    """
+
+    def __init__(self, session, model, fields=None, persist=False, keys=("name",)):
+        super().__init__(session, model, fields, persist)
+        self.keys = tuple(keys)
+        self.loaded = False
+
+    def load(self):
+        if self.store is not None:
+            records = self.store.refresh(self.model, self._search)
+        else:
+            records = self._search([])
+        with self._lock:
+            for field in self.keys:
+                self._keys.add(field)
+                for record in records:
+                    value = self.normalize(field, record.get(field))
+                    self._entries.setdefault((field, value), []).append(record)
+            self.loaded = True
+
+    def _seed(self, field, values):
+        # The whole model is kept up to date by `load`.
+        return
+
+    def prefetch(self, field, values):
+        if field not in self.keys:
+            return super().prefetch(field, values)
+        with self._lock:
+            if not self.loaded:
+                self.load()
+            # Values the loaded model doesn't have are remembered as misses.
+            for value in values:
+                if value not in (None, "", False):
+                    self._entries.setdefault((field, self.normalize(field, value)), [])
+
+    def add(self, record):
+        with self._lock:
+            # Once loaded, a value missing from the index has no record yet.
+            if self.loaded:
+                for field in self.keys:
+                    value = self.normalize(field, record.get(field))
+                    self._entries.setdefault((field, value), [])
+        super().add(record)
+
+
+# Spellings seen in source systems that match neither a code nor a name.
+COUNTRY_ALIASES = {
+    "USA": "US",
+    "U.S.A.": "US",
+    "U.S.": "US",
+    "UNITED STATES OF AMERICA": "US",
+    "AMERICA": "US",
+    "UK": "GB",
+    "U.K.": "GB",
+    "GREAT BRITAIN": "GB",
+    "ENGLAND": "GB",
+    "BRITAIN": "GB",
+    "UAE": "AE",
+    "HOLLAND": "NL",
+    "THE NETHERLANDS": "NL",
+    "SOUTH KOREA": "KR",
+    "KOREA": "KR",
+    "RUSSIA": "RU",
+    "VIETNAM": "VN",
+    "CZECH REPUBLIC": "CZ",
+    "IVORY COAST": "CI",
+}
+
+
+class CountryIndex(ModelIndex):
+    """Countries indexed by code and name, case-insensitively."""
+
+    def __init__(self, session, model, fields=None, persist=False):
+        super().__init__(session, model, fields, persist, keys=("code", "name"))
+
+    @staticmethod
+    def normalize(field, value):
+        if isinstance(value, str):
+            return " ".join(value.split()).upper()
+        return value
+
+    def find(self, value):
+        """Match `value` as a code, a name, then a known alias."""
+        countries = self.get("code", value) or self.get("name", value)
+        if not countries:
+            alias = COUNTRY_ALIASES.get(self.normalize("name", value))
+            if alias:
+                countries = self.get("code", alias)
+        return countries
+
+
+def get_index(session, model, fields=None, factory=LookupIndex, **kwargs):
+    """Return the lookup index for `model` shared by every sink of the run."""
+    with session.lock:
+        index = session.indexes.get(model)
+        if index is None:
+            index = factory(session, model, fields, **kwargs)
+            session.indexes[model] = index
+        return index
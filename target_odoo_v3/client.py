@@ -0,0 +1,663 @@
+"""Shared Odoo XML-RPC and JSON-RPC connection layer used by all sinks."""
+
+import errno
+import http.client
+import itertools
+import json
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+import xmlrpc.client
+from contextlib import contextmanager
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from target_odoo_v3.dryrun import DEFAULT_PLAN_PATH, DryRunClient, load_fixtures
+from target_odoo_v3.metrics import get_metrics
+from target_odoo_v3.store import get_store
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 1.0
+DEFAULT_RETRY_MAX_BACKOFF = 60.0
+
+# Methods that can be sent again whatever happened to the first request.
+READ_METHODS = {
+    "authenticate",
+    "fields_get",
+    "name_search",
+    "read",
+    "search",
+    "search_count",
+    "search_read",
+}
+# Responses meaning the request was turned away before Odoo processed it.
+REJECTED_STATUSES = {429, 503}
+# Responses that may come after the request was processed.
+GATEWAY_STATUSES = {502, 504}
+# Faults of transactions Odoo rolled back because of a concurrent one.
+CONFLICT_FAULTS = (
+    "could not serialize access",
+    "concurrent update",
+    "deadlock detected",
+    "TransactionRollbackError",
+)
+
+logger = logging.getLogger("target-odoo-v3")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class CountingResponse:
+    """HTTP response wrapper counting the bytes read from it."""
+
+    def __init__(self, response, transport):
+        self._response = response
+        self._transport = transport
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        self._transport.received += len(data)
+        return data
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+
+class MeteredTransportMixin:
+    """Socket timeout and byte counts for the XML-RPC transports."""
+
+    timeout = None
+    # Normally set by `request`, which streamed calls don't go through.
+    verbose = False
+    sent = 0
+    received = 0
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+    def send_content(self, connection, request_body):
+        self.sent += len(request_body)
+        super().send_content(connection, request_body)
+
+    def parse_response(self, response):
+        return super().parse_response(CountingResponse(response, self))
+
+
+class TimeoutTransport(MeteredTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class SafeTimeoutTransport(MeteredTransportMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+def classify_error(error, idempotent):
+    """Return `(retry, pressure)` for an error raised by an Odoo call.
+
+    Requests the server turned away or rolled back are always retried, other
+    transport errors only when sending the request twice is harmless.
+    `pressure` tells the server asked us to slow down.
+    """
+    if isinstance(error, xmlrpc.client.Fault):
+        message = str(error.faultString)
+        return any(text in message for text in CONFLICT_FAULTS), False
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        if error.errcode in REJECTED_STATUSES:
+            return True, True
+        if error.errcode in GATEWAY_STATUSES:
+            return idempotent, True
+        return False, False
+    if isinstance(error, ConnectionRefusedError):
+        return True, True
+    if isinstance(error, (TimeoutError, socket.timeout)):
+        return idempotent, True
+    if isinstance(error, (ConnectionError, http.client.HTTPException)):
+        return idempotent, False
+    return False, False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring `Retry-After`."""
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=DEFAULT_RETRY_BACKOFF,
+        max_backoff=DEFAULT_RETRY_MAX_BACKOFF,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, error):
+        headers = getattr(error, "headers", None) or {}
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease.
+
+    Each success raises the limit by `1 / limit` up to `max_limit`. Server
+    pressure halves it, at most once per `cooldown` seconds so a burst of
+    rejected calls counts once.
+    """
+
+    def __init__(self, max_limit, cooldown=1.0):
+        self.max_limit = max(int(max_limit), 1)
+        self.limit = float(self.max_limit)
+        self.cooldown = cooldown
+        self._inflight = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self._inflight >= max(int(self.limit), 1):
+                self._condition.wait()
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._inflight -= 1
+                self._condition.notify_all()
+
+    def success(self):
+        with self._condition:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._condition.notify_all()
+
+    def pressure(self):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._decreased_at < self.cooldown:
+                return
+            self._decreased_at = now
+            self.limit = max(1.0, self.limit / 2)
+            logger.warning(f"Odoo is under pressure, limiting to {int(self.limit)} calls")
+
+
+class OdooClient:
+    """Bounded pool of keep-alive XML-RPC transports for one Odoo url.
+
+    `xmlrpc.client.Transport` keeps its HTTP connection open between requests,
+    so reusing transports avoids a TCP + TLS handshake per call. A transport is
+    not thread safe, hence the pool: each call borrows one, blocking when all
+    `pool_size` transports are in use.
+
+    Every call goes through `retry`, see `classify_error`, and an adaptive
+    limiter that lowers concurrency below `pool_size` under server pressure.
+    """
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, retry=None, timeout=None):
+        self.url = url.rstrip("/")
+        self.pool_size = max(int(pool_size or 1), 1)
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self.limiter = AdaptiveLimiter(self.pool_size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_transport(self):
+        if self.url.startswith("https"):
+            transport = SafeTimeoutTransport()
+        else:
+            transport = TimeoutTransport()
+        transport.timeout = self.timeout
+        return transport
+
+    def _retrying(self, idempotent, func, *args):
+        attempt = 0
+        while True:
+            try:
+                with self.limiter.slot():
+                    result = func(*args)
+            except Exception as error:
+                retry, pressure = classify_error(error, idempotent)
+                if pressure:
+                    self.limiter.pressure()
+                if not retry or attempt >= self.retry.max_retries:
+                    raise
+                delay = self.retry.delay(attempt, error)
+                attempt += 1
+                logger.warning(
+                    f"Odoo call failed ({error!r}), retry {attempt} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                continue
+            self.limiter.success()
+            return result
+
+    @contextmanager
+    def transport(self):
+        try:
+            transport = self._idle.get_nowait()
+        except queue.Empty:
+            transport = None
+            with self._lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    transport = self._new_transport()
+            if transport is None:
+                transport = self._idle.get()
+        try:
+            yield transport
+        finally:
+            self._idle.put(transport)
+
+    @contextmanager
+    def metered(self, transport, model, method):
+        transport.sent = transport.received = 0
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            get_metrics().rpc(
+                model,
+                method,
+                time.perf_counter() - start,
+                transport.sent,
+                transport.received,
+                error,
+            )
+
+    def _call(self, endpoint, method, *params):
+        if method == "execute_kw":
+            model, rpc_method = params[3], params[4]
+        else:
+            model, rpc_method = endpoint, method
+        with self.transport() as transport:
+            proxy = xmlrpc.client.ServerProxy(
+                f"{self.url}/xmlrpc/2/{endpoint}", transport=transport
+            )
+            with self.metered(transport, model, rpc_method):
+                return getattr(proxy, method)(*params)
+
+    def call(self, endpoint, method, *params):
+        return self._retrying(
+            method in READ_METHODS, self._call, endpoint, method, *params
+        )
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        params = [db, uid, password, model, method, args]
+        if kwargs is not None:
+            params.append(kwargs)
+        return self._retrying(
+            method in READ_METHODS, self._call, "object", "execute_kw", *params
+        )
+
+    def execute_kw_streamed(
+        self, db, uid, password, model, method, args, kwargs, stream
+    ):
+        """Like `execute_kw`, but send `stream` in place of its placeholder.
+
+        `stream.placeholder` must appear once in `args`. The request body is
+        split around it and the stream's chunks are written to the socket in
+        between, so large base64 values never have to sit in memory whole.
+        """
+        return self._retrying(
+            method in READ_METHODS,
+            self._execute_kw_streamed,
+            db,
+            uid,
+            password,
+            model,
+            method,
+            args,
+            kwargs,
+            stream,
+        )
+
+    def _execute_kw_streamed(
+        self, db, uid, password, model, method, args, kwargs, stream
+    ):
+        params = [db, uid, password, model, method, args]
+        if kwargs is not None:
+            params.append(kwargs)
+        body = xmlrpc.client.dumps(tuple(params), "execute_kw")
+        body = body.encode("utf-8", "xmlcharrefreplace")
+        prefix, suffix = body.split(stream.placeholder.encode("utf-8"), 1)
+
+        parts = urlsplit(self.url)
+        handler = f"{parts.path}/xmlrpc/2/object"
+        with self.transport() as transport, self.metered(transport, model, method):
+            # As `Transport.request`: a kept-alive connection the server has
+            # closed since fails on first use and is retried once, reconnected.
+            for attempt in (0, 1):
+                try:
+                    return self._send_streamed(
+                        transport, parts.netloc, handler, prefix, stream, suffix
+                    )
+                except http.client.RemoteDisconnected:
+                    if attempt:
+                        raise
+                except OSError as error:
+                    if attempt or error.errno not in (
+                        errno.ECONNRESET,
+                        errno.ECONNABORTED,
+                        errno.EPIPE,
+                    ):
+                        raise
+
+    def _send_streamed(self, transport, host, handler, prefix, stream, suffix):
+        connection = transport.make_connection(host)
+        transport.sent += len(prefix) + stream.length + len(suffix)
+        try:
+            connection.putrequest("POST", handler, skip_accept_encoding=True)
+            connection.putheader("User-Agent", transport.user_agent)
+            connection.putheader("Content-Type", "text/xml")
+            connection.putheader(
+                "Content-Length", str(len(prefix) + stream.length + len(suffix))
+            )
+            connection.endheaders()
+            connection.send(prefix)
+            for chunk in stream:
+                connection.send(chunk)
+            connection.send(suffix)
+            response = connection.getresponse()
+            if response.status == 200:
+                return transport.parse_response(response)[0]
+        except xmlrpc.client.Fault:
+            raise
+        except Exception:
+            transport.close()
+            raise
+        response.read()
+        transport.close()
+        raise xmlrpc.client.ProtocolError(
+            host + handler,
+            response.status,
+            response.reason,
+            dict(response.getheaders()),
+        )
+
+    def close(self):
+        while True:
+            try:
+                transport = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            transport.close()
+            with self._lock:
+                self._created -= 1
+
+
+ACCESS_DENIED_FAULT_CODE = 3
+
+
+class StreamedBody:
+    """Request body sending `stream` between `prefix` and `suffix`.
+
+    Has a length, so `requests` sends a Content-Length instead of chunks.
+    """
+
+    def __init__(self, prefix, stream, suffix):
+        self.prefix = prefix
+        self.stream = stream
+        self.suffix = suffix
+
+    def __len__(self):
+        return len(self.prefix) + self.stream.length + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        yield from self.stream
+        yield self.suffix
+
+
+def jsonrpc_fault(error):
+    """Turn the `error` member of a JSON-RPC response into a `Fault`.
+
+    Sinks and retries only deal with XML-RPC faults, so both transports fail
+    the same way. Odoo's exception name, message and traceback end up in
+    `faultString`.
+    """
+    data = error.get("data") or {}
+    name = data.get("name") or ""
+    code = error.get("code", 1)
+    if name.endswith("AccessDenied"):
+        code = ACCESS_DENIED_FAULT_CODE
+    message = data.get("message") or error.get("message") or ""
+    fault = f"{name}: {message}" if name else message
+    if data.get("debug"):
+        fault = f"{fault}\n{data['debug']}"
+    return xmlrpc.client.Fault(code, fault)
+
+
+class JsonRpcClient(OdooClient):
+    """Client talking to Odoo's `/jsonrpc` endpoint instead of XML-RPC.
+
+    Same surface, retries and limiter as `OdooClient`, but payloads are
+    encoded with the much faster `json` module. Connections are pooled by a
+    shared `requests.Session`. Errors are mapped to the exceptions the
+    XML-RPC transport raises.
+    """
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, retry=None, timeout=None):
+        super().__init__(url, pool_size, retry, timeout)
+        self._ids = itertools.count(1)
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, pool_block=True
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def _payload(self, endpoint, method, params):
+        return json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {"service": endpoint, "method": method, "args": params},
+                "id": next(self._ids),
+            },
+            default=str,
+        ).encode("utf-8")
+
+    def _post(self, body, counter):
+        url = f"{self.url}/jsonrpc"
+        counter.sent = len(body)
+        try:
+            response = self.http.post(
+                url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+        except requests.exceptions.ConnectTimeout as error:
+            raise ConnectionRefusedError(str(error)) from error
+        except requests.exceptions.Timeout as error:
+            raise TimeoutError(str(error)) from error
+        except requests.exceptions.ConnectionError as error:
+            raise ConnectionError(str(error)) from error
+        counter.received = len(response.content)
+        if response.status_code != 200:
+            raise xmlrpc.client.ProtocolError(
+                url, response.status_code, response.reason, dict(response.headers)
+            )
+        content = response.json()
+        if content.get("error"):
+            raise jsonrpc_fault(content["error"])
+        return content.get("result")
+
+    def _call(self, endpoint, method, *params):
+        if method == "execute_kw":
+            model, rpc_method = params[3], params[4]
+        else:
+            model, rpc_method = endpoint, method
+        counter = SimpleNamespace()
+        with self.metered(counter, model, rpc_method):
+            return self._post(self._payload(endpoint, method, list(params)), counter)
+
+    def _execute_kw_streamed(
+        self, db, uid, password, model, method, args, kwargs, stream
+    ):
+        params = [db, uid, password, model, method, args]
+        if kwargs is not None:
+            params.append(kwargs)
+        body = self._payload("object", "execute_kw", params)
+        prefix, suffix = body.split(stream.placeholder.encode("utf-8"), 1)
+        counter = SimpleNamespace()
+        with self.metered(counter, model, method):
+            return self._post(StreamedBody(prefix, stream, suffix), counter)
+
+    def close(self):
+        self.http.close()
+
+
+TRANSPORTS = {"xmlrpc": OdooClient, "jsonrpc": JsonRpcClient}
+
+
+def get_client(
+    url, pool_size=DEFAULT_POOL_SIZE, retry=None, timeout=None, transport="xmlrpc"
+):
+    """Return the process-wide client for `url`, creating it on first use."""
+    if transport not in TRANSPORTS:
+        raise ValueError(
+            f"Unknown transport {transport!r}, expected one of {sorted(TRANSPORTS)}"
+        )
+    key = (url.rstrip("/"), transport)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = TRANSPORTS[transport](key[0], pool_size, retry, timeout)
+            _clients[key] = client
+        return client
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def is_access_denied(error):
+    return (
+        error.faultCode == ACCESS_DENIED_FAULT_CODE
+        or "Access Denied" in str(error.faultString)
+    )
+
+
+class OdooSession:
+    """Authenticated Odoo session shared by every sink of a run.
+
+    Authenticates once and caches the uid. Calls failing with an access-denied
+    fault trigger a single re-authentication and retry.
+    """
+
+    def __init__(self, client, db, username, password):
+        self.client = client
+        self.db = db
+        self.username = username
+        self.password = str(password)
+        self._uid = None
+        self._auth_lock = threading.Lock()
+        # Run-wide lookup caches, see `target_odoo_v3.cache.get_index`.
+        self.indexes = {}
+        # Optional cache persisted between runs, see `target_odoo_v3.store`.
+        self.store = None
+        self.lock = threading.Lock()
+
+    def authenticate(self, stale_uid=None):
+        with self._auth_lock:
+            # Another thread may have already refreshed the uid we saw fail.
+            if self._uid and self._uid != stale_uid:
+                return self._uid
+            uid = None
+            for _ in range(2):
+                uid = self.client.call(
+                    "common", "authenticate", self.db, self.username, self.password, {}
+                )
+                if uid:
+                    break
+            self._uid = uid
+            return uid
+
+    @property
+    def uid(self):
+        if not self._uid:
+            return self.authenticate()
+        return self._uid
+
+    def _call(self, func, *args):
+        uid = self.uid
+        try:
+            return func(self.db, uid, self.password, *args)
+        except xmlrpc.client.Fault as error:
+            if not is_access_denied(error):
+                raise
+            uid = self.authenticate(stale_uid=uid)
+            return func(self.db, uid, self.password, *args)
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        return self._call(self.client.execute_kw, model, method, args, kwargs)
+
+    def execute_kw_streamed(self, model, method, args, kwargs, stream):
+        return self._call(
+            self.client.execute_kw_streamed, model, method, args, kwargs, stream
+        )
+
+
+def get_session(config):
+    """Return the process-wide session for the given target config."""
+    key = (config.get("url"), config.get("db"), config.get("username"))
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # Every concurrent worker needs a connection of its own.
+            pool_size = config.get("connection_pool_size") or max(
+                DEFAULT_POOL_SIZE, int(config.get("max_workers") or 1)
+            )
+            max_retries = config.get("max_retries")
+            retry = RetryPolicy(
+                DEFAULT_MAX_RETRIES if max_retries is None else int(max_retries),
+                config.get("retry_backoff") or DEFAULT_RETRY_BACKOFF,
+                config.get("retry_max_backoff") or DEFAULT_RETRY_MAX_BACKOFF,
+            )
+            store = get_store(config)
+            if config.get("dry_run"):
+                # Planned records must not reach the persistent cache.
+                client = DryRunClient(
+                    config.get("dry_run_plan") or DEFAULT_PLAN_PATH,
+                    load_fixtures(config.get("dry_run_fixtures")),
+                    store,
+                )
+                store = None
+            else:
+                client = get_client(
+                    config.get("url"),
+                    pool_size,
+                    retry,
+                    config.get("request_timeout"),
+                    config.get("transport") or "xmlrpc",
+                )
+            session = OdooSession(
+                client,
+                config.get("db"),
+                config.get("username"),
+                config.get("password"),
+            )
+            session.store = store
+            _sessions[key] = session
+        return session
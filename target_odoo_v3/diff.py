@@ -0,0 +1,69 @@
+"""Field level diffs between records read from Odoo and mapped payloads."""
+
+from itertools import zip_longest
+
+# Floats read back from Odoo are rounded to the field's digits.
+FLOAT_PRECISION = 1e-6
+
+
+def normalize(value):
+    """Bring a value read from Odoo and a payload value to the same shape.
+
+    Many2one fields read as `[id, display_name]` compare as their id,
+    many2many fields as a sorted id list and Odoo's `False` as None.
+    """
+    if value is False:
+        return None
+    if isinstance(value, (list, tuple)):
+        if len(value) == 2 and isinstance(value[0], int) and isinstance(value[1], str):
+            return value[0]
+        if all(isinstance(v, int) for v in value):
+            return sorted(value)
+    return value
+
+
+def same_value(current, new):
+    current, new = normalize(current), normalize(new)
+    if isinstance(current, float) or isinstance(new, float):
+        try:
+            return abs(float(current or 0) - float(new or 0)) < FLOAT_PRECISION
+        except (TypeError, ValueError):
+            return False
+    return current == new
+
+
+def changed_fields(current, payload, fields=None):
+    """Return the values of `payload` that differ from the `current` record.
+
+    Only `fields` are compared when given. Id lists are turned into a
+    many2many replace command, so the result can be sent to `write` as is.
+    """
+    changes = {}
+    for field in payload if fields is None else fields:
+        if field not in payload or same_value(current.get(field), payload[field]):
+            continue
+        value = payload[field]
+        if isinstance(value, list) and all(isinstance(v, int) for v in value):
+            value = [(6, 0, value)]
+        changes[field] = value
+    return changes
+
+
+def line_commands(current_lines, new_lines, fields=None):
+    """One2many commands turning `current_lines` into `new_lines`.
+
+    Lines are matched by position: changed lines get an update command with
+    only their changed fields, extra new lines are created and extra current
+    lines removed. Unchanged lines produce no command.
+    """
+    commands = []
+    for line, vals in zip_longest(current_lines, new_lines):
+        if vals is None:
+            commands.append((2, line["id"], 0))
+        elif line is None:
+            commands.append((0, 0, vals))
+        else:
+            changes = changed_fields(line, vals, fields)
+            if changes:
+                commands.append((1, line["id"], changes))
+    return commands
@@ -0,0 +1,193 @@
+"""Dry-run client: plans the calls of a run without sending any of them."""
+
+import itertools
+import json
+import threading
+import xmlrpc.client
+
+DEFAULT_PLAN_PATH = "dry_run_plan.jsonl"
+# Ids handed out for records the run would create.
+FIRST_PLANNED_ID = 1000000000
+
+LOOKUP_METHODS = {"read", "search", "search_count", "search_read"}
+
+
+def domain_matches(record, domain):
+    """Evaluate a flat `search` domain, conditions are and-ed."""
+    for condition in domain:
+        if not isinstance(condition, (list, tuple)):
+            continue
+        field, operator, value = condition
+        current = record.get(field)
+        if isinstance(current, (list, tuple)) and len(current) == 2:
+            current = current[0]
+        if operator == "=":
+            ok = current == value
+        elif operator == "!=":
+            ok = current != value
+        elif operator == "in":
+            ok = current in value
+        elif operator == "not in":
+            ok = current not in value
+        elif operator in ("like", "ilike", "=ilike"):
+            ok = isinstance(current, str) and (
+                str(value).lower() == current.lower()
+                if operator == "=ilike"
+                else str(value).lower() in current.lower()
+            )
+        elif current is None or current is False:
+            ok = False
+        elif operator == ">=":
+            ok = current >= value
+        elif operator == "<=":
+            ok = current <= value
+        elif operator == ">":
+            ok = current > value
+        elif operator == "<":
+            ok = current < value
+        else:
+            ok = True
+        if not ok:
+            return False
+    return True
+
+
+class DryRunClient:
+    """Client with the surface of `OdooClient` that never reaches Odoo.
+
+    Lookups are answered from `fixtures` (`{model: [records]}`), then from
+    the persistent cache, and see the records planned so far. Every other
+    call is appended to the JSON lines `plan_path` with the size its
+    XML-RPC request would have had. `totals` counts calls and bytes per
+    model and method, lookups included.
+    """
+
+    def __init__(self, plan_path=DEFAULT_PLAN_PATH, fixtures=None, store=None):
+        self.store = store
+        self.tables = {
+            model: [dict(record) for record in records]
+            for model, records in (fixtures or {}).items()
+        }
+        self.totals = {}
+        self._ids = itertools.count(FIRST_PLANNED_ID)
+        self._seq = itertools.count(1)
+        self._lock = threading.RLock()
+        self._plan = open(plan_path, "w")
+
+    def _table(self, model):
+        if model not in self.tables:
+            self.tables[model] = self.store.records(model) if self.store else []
+        return self.tables[model]
+
+    def _count(self, model, method, size):
+        total = self.totals.setdefault((model, method), {"calls": 0, "bytes": 0})
+        total["calls"] += 1
+        total["bytes"] += size
+
+    def _plan_call(self, model, method, args, kwargs, size):
+        self._plan.write(
+            json.dumps(
+                {
+                    "seq": next(self._seq),
+                    "model": model,
+                    "method": method,
+                    "args": args,
+                    "kwargs": kwargs,
+                    "bytes": size,
+                },
+                default=str,
+            )
+            + "\n"
+        )
+
+    def call(self, endpoint, method, *params):
+        size = len(xmlrpc.client.dumps(params, method, allow_none=True))
+        with self._lock:
+            self._count(endpoint, method, size)
+        if method == "authenticate":
+            return 1
+        raise xmlrpc.client.Fault(1, f"{endpoint}.{method} is not supported in dry runs")
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        params = (db, uid, password, model, method, args)
+        if kwargs is not None:
+            params += (kwargs,)
+        size = len(xmlrpc.client.dumps(params, "execute_kw", allow_none=True))
+        return self._execute(model, method, args, kwargs or {}, size)
+
+    def execute_kw_streamed(
+        self, db, uid, password, model, method, args, kwargs, stream
+    ):
+        params = (db, uid, password, model, method, args)
+        if kwargs is not None:
+            params += (kwargs,)
+        body = xmlrpc.client.dumps(params, "execute_kw", allow_none=True)
+        size = len(body) - len(stream.placeholder) + stream.length
+        return self._execute(model, method, args, kwargs or {}, size)
+
+    def _execute(self, model, method, args, kwargs, size):
+        with self._lock:
+            self._count(model, method, size)
+            table = self._table(model)
+            if method in LOOKUP_METHODS:
+                if method == "read":
+                    ids = set(args[0])
+                    records = [r for r in table if r.get("id") in ids]
+                else:
+                    domain = args[0] if args else kwargs.get("domain", [])
+                    records = [r for r in table if domain_matches(r, domain)]
+                if method == "search_count":
+                    return len(records)
+                if method == "search":
+                    return [r["id"] for r in records]
+                fields = kwargs.get("fields") or (args[1] if len(args) > 1 else None)
+                if fields:
+                    records = [
+                        {f: r.get(f, False) for f in set(fields) | {"id"}}
+                        for r in records
+                    ]
+                return [dict(r) for r in records]
+
+            self._plan_call(model, method, args, kwargs, size)
+            if method == "create":
+                values = args[0]
+                ids = []
+                for vals in values if isinstance(values, list) else [values]:
+                    record = dict(vals, id=next(self._ids))
+                    table.append(record)
+                    ids.append(record["id"])
+                return ids if isinstance(values, list) else ids[0]
+            if method == "write":
+                ids = set(args[0])
+                for record in table:
+                    if record.get("id") in ids:
+                        record.update(args[1])
+            elif method == "action_post":
+                ids = set(args[0])
+                for record in table:
+                    if record.get("id") in ids:
+                        record["state"] = "posted"
+            return True
+
+    def report(self, logger):
+        """Log the planned calls and bytes per model and method."""
+        logger.info("Dry run call plan:")
+        for (model, method), total in sorted(self.totals.items()):
+            logger.info(
+                f"  {model}.{method}: {total['calls']} calls, {total['bytes']} bytes"
+            )
+        calls = sum(total["calls"] for total in self.totals.values())
+        size = sum(total["bytes"] for total in self.totals.values())
+        logger.info(f"  total: {calls} calls, {size} bytes")
+
+    def close(self):
+        with self._lock:
+            if not self._plan.closed:
+                self._plan.close()
+
+
+def load_fixtures(path):
+    if not path:
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,90 @@
+"""Local checkpoint journal, so interrupted runs can resume where they died."""
+
+import json
+import os
+import threading
+
+# Stages a record goes through, in order. "lines" means every line is on the
+# move, which is the case as soon as it is created with its lines. Moves
+# created a chunk of lines at a time are "created" until the last chunk.
+STAGES = ("created", "lines", "attachments", "posted")
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+class CheckpointJournal:
+    """Append-only JSON lines file mapping source keys to Odoo ids and stages.
+
+    Every change is flushed and synced before the call returns. The file is
+    compacted to one line per key when it is opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves a truncated last line.
+                        continue
+                    self._entries[entry["key"]] = entry
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        self._file = open(path, "a")
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def reached(self, key, stage):
+        entry = self.get(key)
+        return entry is not None and STAGES.index(entry["stage"]) >= STAGES.index(
+            stage
+        )
+
+    def mark(self, key, id, stage):
+        """Record that the record `key`, created as `id`, reached `stage`.
+
+        Stages only move forward, unless the record was created again under
+        another id.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and entry["id"] == id
+                and STAGES.index(entry["stage"]) >= STAGES.index(stage)
+            ):
+                return
+            entry = {"key": key, "id": id, "stage": stage}
+            self._entries[key] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def get_journal(config):
+    """Return the journal configured by `checkpoint_path`, if any."""
+    path = config.get("checkpoint_path")
+    if not path:
+        return None
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = CheckpointJournal(path)
+            _journals[path] = journal
+        return journal
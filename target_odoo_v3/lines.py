@@ -0,0 +1,45 @@
+"""Incremental reading of line items, for documents too large to map at once."""
+
+import json
+from itertools import islice
+from json.decoder import WHITESPACE
+
+# Used when resuming a chunked create without `line_chunk_size` set.
+DEFAULT_LINE_CHUNK_SIZE = 500
+
+
+def iter_line_items(line_items):
+    """Yield the line items of a record one by one.
+
+    A JSON array string is decoded one item at a time with `raw_decode`, so
+    only the item being mapped is held next to the source string.
+    """
+    if not isinstance(line_items, str):
+        yield from line_items or []
+        return
+    decoder = json.JSONDecoder()
+    pos = WHITESPACE.match(line_items, 0).end()
+    if not line_items.startswith("[", pos):
+        raise ValueError(f"Expected a JSON array of line items at char {pos}")
+    pos = WHITESPACE.match(line_items, pos + 1).end()
+    if line_items.startswith("]", pos):
+        return
+    while True:
+        item, pos = decoder.raw_decode(line_items, pos)
+        yield item
+        pos = WHITESPACE.match(line_items, pos).end()
+        if line_items.startswith("]", pos):
+            return
+        if not line_items.startswith(",", pos):
+            raise ValueError(f"Expected ',' or ']' in line items at char {pos}")
+        pos = WHITESPACE.match(line_items, pos + 1).end()
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items of `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
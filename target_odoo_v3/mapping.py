@@ -1,8 +1,70 @@
 import json
 import os
+import threading
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
+ADDRESS_KEYS = {"address", "addresses", "phoneNumbers"}
+
+_mappers = {}
+_mappers_lock = threading.Lock()
+
+
+class FieldMapper:
+    """Mapping of one endpoint, compiled once from `mapping.json`."""
+
+    def __init__(self, mapping, ignore):
+        # (source key, target field or nested submap), in file order.
+        self.fields = []
+        for key, target in mapping.items():
+            if key in ADDRESS_KEYS:
+                self.fields.append((key, dict(target)))
+            else:
+                self.fields.append((key, target))
+        self.ignore = set(ignore)
+
+    @staticmethod
+    def map_address(address, address_mapping, payload):
+        if isinstance(address, str):
+            address = json.loads(address)
+
+        if isinstance(address, dict):
+            for key, value in address.items():
+                if key in address_mapping:
+                    payload[address_mapping[key]] = value
+
+        return payload
+
+    def map(self, record):
+        payload = {}
+        for key, target in self.fields:
+            if isinstance(target, dict):
+                self.map_address(record.get(key, []), target, payload)
+            else:
+                val = record.get(key, "")
+                if val:
+                    payload[target] = val
+        return {
+            key: value
+            for key, value in payload.items()
+            if key not in self.ignore and key is not None
+        }
+
+    def map_many(self, records):
+        return [self.map(record) for record in records]
+
+
+def get_mapper(endpoint):
+    """Return the compiled mapper of `endpoint`, loading `mapping.json` once."""
+    with _mappers_lock:
+        if not _mappers:
+            with open(os.path.join(__location__, "mapping.json"), "r") as filetoread:
+                content = json.loads(filetoread.read())
+            ignore = content.pop("ignore")
+            for name, mapping in content.items():
+                _mappers[name] = FieldMapper(mapping, ignore)
+        return _mappers[endpoint]
+
 
 class UnifiedMapping:
     def __init__(self) -> None:
@@ -20,15 +82,7 @@ class UnifiedMapping:
 
     # Microsoft dynamics address mapping
     def map_address(self, address, address_mapping, payload):
-        if isinstance(address, str):
-            address = json.loads(address)
-
-        if isinstance(address, dict):
-            for key, value in address.items():
-                if key in address_mapping.keys():
-                    payload[address_mapping[key]] = value
-
-        return payload
+        return FieldMapper.map_address(address, address_mapping, payload)
 
     def map_custom_fields(self, payload, fields):
         # Populate custom fields.
@@ -37,27 +91,7 @@ class UnifiedMapping:
         return payload
 
     def prepare_payload(self, record, endpoint="invoice"):
-        mapping = self.read_json_file(f"mapping.json")
-        ignore = mapping["ignore"]
-        mapping = mapping[endpoint]
-        payload = {}
-        payload_return = {}
-        lookup_keys = mapping.keys()
-        for lookup_key in lookup_keys:
-            if lookup_key == "address" or lookup_key == "addresses":
-                payload = self.map_address(
-                    record.get(lookup_key, []), mapping[lookup_key], payload
-                )
-            elif lookup_key == "phoneNumbers":
-                payload = self.map_address(
-                    record.get(lookup_key, []), mapping[lookup_key], payload
-                )
-            else:
-                val = record.get(lookup_key, "")
-                if val:
-                    payload[mapping[lookup_key]] = val
+        return get_mapper(endpoint).map(record)
 
-        for key in payload.keys():
-            if key not in ignore and key is not None:
-                payload_return[key] = payload[key]
-        return payload_return
+    def prepare_payloads(self, records, endpoint="invoice"):
+        return get_mapper(endpoint).map_many(records)
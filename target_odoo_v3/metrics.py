@@ -0,0 +1,194 @@
+"""Run-wide instrumentation: RPC calls, payload sizes and sink stage timings."""
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_active = threading.local()
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        ms = seconds * 1000
+        for index, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the `q` quantile, in seconds."""
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                if index < len(BUCKETS_MS):
+                    return BUCKETS_MS[index] / 1000
+                return self.max
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "max_seconds": round(self.max, 6),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "p99_seconds": self.quantile(0.99),
+            "buckets_ms": {
+                str(bound): count
+                for bound, count in zip(BUCKETS_MS + ("inf",), self.buckets)
+            },
+        }
+
+
+class Metrics:
+    """Thread safe counters and histograms shared by every sink of a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rpcs = {}
+        self.stages = {}
+
+    def rpc(self, model, method, seconds, sent=0, received=0, error=False):
+        with self._lock:
+            entry = self.rpcs.get((model, method))
+            if entry is None:
+                entry = self.rpcs[(model, method)] = {
+                    "latency": Histogram(),
+                    "errors": 0,
+                    "request_bytes": 0,
+                    "response_bytes": 0,
+                }
+            entry["latency"].observe(seconds)
+            entry["errors"] += int(error)
+            entry["request_bytes"] += sent
+            entry["response_bytes"] += received
+
+    def stage(self, stream, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get((stream, stage))
+            if histogram is None:
+                histogram = self.stages[(stream, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stream, stage):
+        # A stage nested in itself, e.g. a bulk create falling back to single
+        # creates, is only timed once.
+        active = getattr(_active, "stages", None)
+        if active is None:
+            active = _active.stages = set()
+        if (stream, stage) in active:
+            yield
+            return
+        active.add((stream, stage))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            active.discard((stream, stage))
+            self.stage(stream, stage, time.perf_counter() - start)
+
+    def summary(self, indexes=None):
+        """Return every metric as a JSON serializable dict."""
+        with self._lock:
+            summary = {
+                "rpc": [
+                    dict(
+                        model=model,
+                        method=method,
+                        errors=entry["errors"],
+                        request_bytes=entry["request_bytes"],
+                        response_bytes=entry["response_bytes"],
+                        **entry["latency"].to_dict(),
+                    )
+                    for (model, method), entry in sorted(self.rpcs.items())
+                ],
+                "stages": [
+                    dict(stream=stream, stage=stage, **histogram.to_dict())
+                    for (stream, stage), histogram in sorted(self.stages.items())
+                ],
+            }
+        summary["cache"] = [
+            {
+                "model": model,
+                "hits": index.hits,
+                "misses": index.misses,
+                "hit_rate": round(index.hits / (index.hits + index.misses), 4)
+                if index.hits + index.misses
+                else None,
+            }
+            for model, index in sorted((indexes or {}).items())
+        ]
+        return summary
+
+    def emit(self, logger, path=None, indexes=None):
+        """Log the metrics as Singer `METRIC` messages, and write them to `path`."""
+        summary = self.summary(indexes)
+        for rpc in summary["rpc"]:
+            tags = {"model": rpc["model"], "method": rpc["method"]}
+            log_metric(logger, "counter", "rpc_count", rpc["count"], tags)
+            log_metric(logger, "timer", "rpc_duration", rpc["total_seconds"], tags)
+            log_metric(logger, "counter", "rpc_errors", rpc["errors"], tags)
+            log_metric(
+                logger, "counter", "rpc_request_bytes", rpc["request_bytes"], tags
+            )
+            log_metric(
+                logger, "counter", "rpc_response_bytes", rpc["response_bytes"], tags
+            )
+        for stage in summary["stages"]:
+            tags = {"stream": stage["stream"], "stage": stage["stage"]}
+            log_metric(logger, "timer", "stage_duration", stage["total_seconds"], tags)
+        for cache in summary["cache"]:
+            tags = {"model": cache["model"]}
+            log_metric(logger, "counter", "cache_hits", cache["hits"], tags)
+            log_metric(logger, "counter", "cache_misses", cache["misses"], tags)
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+        return summary
+
+
+def log_metric(logger, type, metric, value, tags):
+    logger.info(
+        "METRIC: "
+        + json.dumps({"type": type, "metric": metric, "value": value, "tags": tags})
+    )
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the metrics of the run."""
+    return _metrics
+
+
+def timed(stage):
+    """Time a sink method as `stage` of the sink's stream."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with _metrics.timer(self.name, stage):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
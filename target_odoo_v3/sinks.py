@@ -1,23 +1,60 @@
 """OdooV2 target sink class, which handles writing streams."""
 
 
+import hashlib
 import json
+import logging
+import reprlib
+import threading
+import time
 import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 from dateutil.parser import parse
 from singer_sdk.plugin_base import PluginBase
 from singer_sdk.sinks import RecordSink
 
-from target_odoo_v3.mapping import UnifiedMapping
-import base64
+from target_odoo_v3.attachments import (
+    DEFAULT_MAX_INFLIGHT_BYTES,
+    DEFAULT_WORKERS,
+    AttachmentUploader,
+    Base64FileStream,
+)
+from target_odoo_v3.cache import CountryIndex, ModelIndex, get_index
+from target_odoo_v3.client import get_session
+from target_odoo_v3.diff import changed_fields, line_commands
+from target_odoo_v3.journal import get_journal
+from target_odoo_v3.lines import DEFAULT_LINE_CHUNK_SIZE, chunked, iter_line_items
+from target_odoo_v3.mapping import get_mapper
+from target_odoo_v3.metrics import get_metrics, timed
 import os.path
 from target_hotglue.client import HotglueSink
 
 
+# Used by `log_payloads: truncated`, never renders a payload in full.
+PAYLOAD_REPR = reprlib.Repr()
+PAYLOAD_REPR.maxlevel = 4
+PAYLOAD_REPR.maxdict = 20
+PAYLOAD_REPR.maxlist = 20
+PAYLOAD_REPR.maxstring = 200
+PAYLOAD_REPR.maxother = 200
+
+
+def unknown_outcome(error):
+    """Error reported for records of a create that may have been applied."""
+    return f"Create failed with an unknown outcome, check Odoo before retrying: {error}"
+
+
 class OdooV3Sink(HotglueSink):
     """OdooV2 target sink class."""
 
+    # Whether records of this sink may be processed by several workers.
+    concurrent = False
+    # Whether other streams look up the records this sink creates. Such sinks
+    # are flushed before any other sink flushes.
+    references = False
+
     def __init__(
         self,
         target: PluginBase,
@@ -28,97 +65,273 @@ class OdooV3Sink(HotglueSink):
         super().__init__(target, stream_name, schema, key_properties)
 
         self.url = self.config.get("url")
-        self.db = self.config.get("db")
-        self.user = self.config.get("username")
-        self.password = self.config.get("password")
-        self.uid = self.auth()
+        # One authenticated session is shared by every sink of the run.
+        self.session = get_session(self.config)
+        self.products = get_index(self.session, "product.product", persist=True)
+        self.partners = get_index(self.session, "res.partner")
+        self.accounts = get_index(
+            self.session,
+            "account.account",
+            factory=ModelIndex,
+            persist=True,
+            keys=("code", "name"),
+        )
+        self.currencies = get_index(
+            self.session,
+            "res.currency",
+            factory=ModelIndex,
+            persist=True,
+            keys=("name",),
+        )
+        self.countries = get_index(
+            self.session, "res.country", factory=CountryIndex, persist=True
+        )
+        # Shared by every sink, taxes created during the run are added to it.
+        self.taxes = get_index(
+            self.session,
+            "account.tax",
+            factory=ModelIndex,
+            persist=True,
+            keys=("name",),
+        )
+        self.tax_groups = get_index(
+            self.session,
+            "account.tax.group",
+            factory=ModelIndex,
+            persist=True,
+            keys=("name",),
+        )
         self.so_id = {}
-        self.models = None
-        self.currencies = None
-        self.tax_list = None
-        self.tax_group_list = None
-        if self.uid == None:
-            self.uid = self.auth()
-
-        models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
-        self.models = models
-
-    def auth(self):
-        common = xmlrpc.client.ServerProxy("{}/xmlrpc/2/common".format(self.url))
-        return common.authenticate(self.db, self.user, str(self.password), {})
-
-    def query_odoo(self, stream_name, filters):
-        return self.models.execute_kw(
-            self.db, self.uid, str(self.password), stream_name, "search_read", filters
+        self._buffer = []
+        self._buffer_started = None
+        # Held while the buffer is taken and processed, so a sink drained on
+        # several threads at once processes every record once and sinks
+        # waiting on a reference flush see its records created.
+        self._flush_lock = threading.RLock()
+
+    @property
+    def bulk_create(self):
+        return int(self.config.get("batch_size") or 1) > 1
+
+    @property
+    def max_workers(self):
+        if not self.concurrent:
+            return 1
+        return max(int(self.config.get("max_workers") or 1), 1)
+
+    @property
+    def batch_size(self):
+        # Concurrent workers need a buffer to pick records from.
+        return max(int(self.config.get("batch_size") or 1), self.max_workers)
+
+    @property
+    def batch_max_latency(self):
+        return float(self.config.get("batch_max_latency") or 60)
+
+    @property
+    def line_chunk_size(self):
+        # 0 maps and creates every line of a document at once.
+        return max(int(self.config.get("line_chunk_size") or 0), 0)
+
+    @property
+    def max_size(self) -> int:
+        return self.batch_size
+
+    @property
+    def current_size(self) -> int:
+        return len(self._buffer)
+
+    def process_record(self, record: dict, context: dict) -> None:
+        # Records always go through the buffer, flushed right away unless
+        # batching or concurrency is enabled.
+        if not self.latest_state:
+            self.init_state()
+
+        hash = self.build_record_hash(record)
+        if any(item["hash"] == hash for item in self._buffer):
+            # Settle the first copy so this one is deduplicated as usual.
+            self.flush()
+        existing_state = self.get_existing_state(hash)
+        if existing_state:
+            return self.update_state(existing_state, is_duplicate=True)
+
+        with self._flush_lock:
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.append(
+                {
+                    "record": record,
+                    "context": context,
+                    "hash": hash,
+                    "externalId": record.pop("externalId", None),
+                }
+            )
+        if (
+            len(self._buffer) >= self.batch_size
+            or time.monotonic() - self._buffer_started >= self.batch_max_latency
+        ):
+            self.flush()
+
+    def process_batch(self, context: dict) -> None:
+        self.flush()
+
+    def flush(self):
+        """Process every buffered record and report its state."""
+        if not self.references:
+            self.flush_references()
+        with self._flush_lock:
+            items, self._buffer = self._buffer, []
+            if not items:
+                return
+            try:
+                results = self.process_batch_records(items)
+            except Exception as e:
+                # Batch stages fall back to `upsert_each`, only a lone record
+                # or an error past that fallback gets here.
+                self.logger.exception(f"Upsert record error {str(e)}")
+                results = [(None, False, {"error": str(e)}) for _ in items]
+            for item, (id, success, state_updates) in zip(items, results):
+                self.finish_record(item, id, success, state_updates)
+
+    def flush_references(self):
+        # Vendors and tax rates still buffered must exist before records
+        # referencing them are mapped. A reference sink already flushing on
+        # another drain thread is waited for through its lock.
+        for sink in list(self._target._sinks_active.values()):
+            if isinstance(sink, OdooV3Sink) and sink.references:
+                sink.flush()
+
+    def process_batch_records(self, items):
+        """Return an `(id, success, state_updates)` tuple per buffered record.
+
+        Sinks that can create several records with one call override this;
+        the default upserts the records one by one.
+        """
+        return self.map_records(
+            lambda item: self.try_upsert(item["record"], item["context"]), items
         )
 
+    def upsert_each(self, items, results, error):
+        """Fallback of a failed batch stage: upsert records one by one.
+
+        Fills in the `results` still None by upserting their records on their
+        own, so only the records that fail again are reported as failed. A
+        batch of one record re-raises `error`.
+        """
+        if len(items) <= 1:
+            raise error
+        self.logger.warning(
+            f"Processing {len(items)} {self.name} records as a batch failed: "
+            f"{error}. Falling back to one record at a time."
+        )
+        pending = [index for index, result in enumerate(results) if result is None]
+        upserted = OdooV3Sink.process_batch_records(self, [items[i] for i in pending])
+        for index, result in zip(pending, upserted):
+            results[index] = result
+        return results
+
+    def map_records(self, func, items):
+        """Apply `func` to every item, on `max_workers` threads if enabled.
+
+        Each worker borrows its own connection from the session pool. Results
+        come back in input order so states are reported from the main thread.
+        """
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=self.name
+        ) as executor:
+            return list(executor.map(func, items))
+
+    def try_upsert(self, record, context):
+        try:
+            return self.upsert_record(record, context)
+        except Exception as e:
+            self.logger.exception(f"Upsert record error {str(e)}")
+            return None, False, {"error": str(e)}
+
+    def finish_record(self, item, id, success, state_updates):
+        # Mirrors the bookkeeping of HotglueSink.process_record.
+        if state_updates and state_updates.pop("existing", False):
+            state = {"hash": item["hash"], "id": id}
+            return self.update_state(state, is_duplicate=True)
+        if success:
+            self.logger.info(f"{self.name} processed id: {id}")
+        state = {"hash": item["hash"], "success": success}
+        if id:
+            state["id"] = id
+        if item["externalId"]:
+            state["externalId"] = item["externalId"]
+        if state_updates and isinstance(state_updates, dict):
+            state = dict(state, **state_updates)
+        self.update_state(state)
+
+    def log_payload(self, action, stream_name, payload):
+        """Log a payload sent to Odoo, as set by `log_payloads`.
+
+        `full` (the default) logs it whole, `truncated` an abbreviated form
+        and `debug` only logs it at debug level.
+        """
+        mode = self.config.get("log_payloads") or "full"
+        if mode == "debug":
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f" {action} {self.name}: {stream_name} - {payload}")
+            return
+        if mode == "truncated":
+            payload = PAYLOAD_REPR.repr(payload)
+        self.logger.info(f" {action} {self.name}: {stream_name} - {payload}")
+
+    def execute_kw(self, stream_name, method, args, kwargs=None):
+        return self.session.execute_kw(stream_name, method, args, kwargs)
+
     def find_parnter(self, parnter_name):
-        filters = [[["name", "=", parnter_name]]]
-        return self.query_odoo("res.partner", filters)
+        return self.partners.get("name", parnter_name)
+
+    @timed("lookup")
+    def prefetch_partners(self, names):
+        # Resolve every partner name with one query, misses are remembered.
+        self.partners.prefetch("name", names)
 
     def find_product(self, field_value, field="name"):
-        filters = [[[field, "=", field_value]]]
-        return self.query_odoo("product.product", filters)
+        return self.products.get(field, field_value)
+
+    @timed("lookup")
+    def prefetch_products(self, line_items, key, field="name"):
+        # Resolve every product referenced by the lines with one query.
+        self.products.prefetch(field, [rec.get(key) for rec in line_items])
 
     def find_company(self, name, company_type=None):
-        filters = [[["name", "=", name]]]
+        partners = self.partners.get("name", name)
         if company_type is not None:
-            filters[0].append(["company_type", "=", company_type])
-        return self.query_odoo("res.partner", filters)
+            partners = [p for p in partners if p.get("company_type") == company_type]
+        return partners
 
     def find_account(self, name, lookup_key="name"):
-        filters = [[[f"{lookup_key}", "=", name]]]
-
-        return self.query_odoo("account.account", filters)
+        # The chart of accounts is loaded once and indexed by code and name.
+        return self.accounts.get(lookup_key, name)
 
     def find_country(self, name):
-        filters = [[["name", "=", name]]]
-        return self.query_odoo("res.country", filters)
-
-    def find_invoice(self, val, field="ref"):
-        filters = [[[field, "=", val]]]
-        return self.query_odoo("account.move", filters)
-
-    def get_odoo_taxes(self, name=None):
-        filters = []
-        if name is not None:
-            filters = [[["name", "=", name]]]
-
-        return self.query_odoo("account.tax", filters)
+        # Matches codes, names and common aliases from the preloaded table.
+        return self.countries.find(name)
 
     def find_currency(self, name):
-        filters = []
-        if self.currencies is None:
-            currencies = {}
-            res = self.query_odoo("res.currency", filters)
-            if res:
-                for currency in res:
-                    currencies[currency["name"]] = currency
-                self.currencies = currencies
-
-        if name in self.currencies:
-            return self.currencies[name]
-        else:
-            return None
+        # Loaded once per run, shared (and locked) across workers.
+        currencies = self.currencies.get("name", name)
+        if currencies:
+            return currencies[0]
+        return None
 
+    @timed("create")
     def _post_odoo(self, stream_name, record, context=None):
-        password = str(self._config.get("password"))
-        db = self._config.get("db")
         #Log all of the payloads except for the attachments
         if stream_name != "ir.attachment":
-            self.logger.info(f" Posting {self.name}: {stream_name} - {record}")
-
-        models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
-        self.models = models
+            self.log_payload("Posting", stream_name, record)
         if context is None:
             context_dictionary = {"lang": "en_US"}
         else:
             context_dictionary = context
         try:
-            res = models.execute_kw(
-                db,
-                self.uid,
-                str(password),
+            res = self.execute_kw(
                 stream_name,
                 "create",
                 [record],
@@ -128,75 +341,231 @@ class OdooV3Sink(HotglueSink):
         except xmlrpc.client.Fault as error:
             self.logger.warning(error.faultString)
 
-    # TODO apparently duplicate function was not required. Keeping it for other jobs stability
-    def _update_odoo(
-        self, stream_name, record, update_id=None, context=None, action="write"
+    @timed("create")
+    def _post_odoo_many(self, stream_name, records, context=None):
+        """Create several records with one call.
+
+        Returns the new ids in input order, None for records that could not
+        be created. If Odoo rejects the batch with a Fault, every record is
+        created on its own so one bad record can't fail the rest. Any other
+        error leaves the outcome unknown, the batch may have been committed,
+        so it is raised instead of creating the records again.
+        """
+        if len(records) > 1:
+            self.log_payload("Posting", stream_name, records)
+            if context is None:
+                context = {"lang": "en_US"}
+            try:
+                ids = self.execute_kw(
+                    stream_name, "create", [records], {"context": context}
+                )
+                return ids if isinstance(ids, list) else [ids]
+            except xmlrpc.client.Fault as error:
+                self.logger.warning(
+                    f"Creating {len(records)} {stream_name} records failed: "
+                    f"{error.faultString}. Falling back to one create per record."
+                )
+            except Exception as error:
+                self.logger.warning(
+                    f"Creating {len(records)} {stream_name} records failed: "
+                    f"{error}. They may have been created, not sending them again."
+                )
+                raise
+        ids = []
+        for record in records:
+            try:
+                ids.append(self._post_odoo(stream_name, record, context))
+            except Exception as error:
+                self.logger.exception(f"Creating {stream_name} failed: {error}")
+                ids.append(None)
+        return ids
+
+    @timed("update")
+    def _update_odoo_many(self, stream_name, updates, context=None):
+        """Apply `(id, changes)` updates, one `write` per distinct change set.
+
+        Records needing the same change share a call. Returns the ids whose
+        write failed.
+        """
+        groups = {}
+        for record_id, changes in updates:
+            key = json.dumps(changes, sort_keys=True, default=str)
+            groups.setdefault(key, (changes, []))[1].append(record_id)
+        if context is None:
+            context = {"lang": "en_US"}
+        failed = set()
+        for changes, ids in groups.values():
+            self.log_payload("Updating", stream_name, [ids, changes])
+            try:
+                self.execute_kw(stream_name, "write", [ids, changes], {"context": context})
+            except xmlrpc.client.Fault as error:
+                self.logger.warning(error.faultString)
+                failed.update(ids)
+            except Exception as error:
+                self.logger.exception(f"Updating {stream_name} {ids} failed: {error}")
+                failed.update(ids)
+        return failed
+
+    @timed("create")
+    def create_with_lines(
+        self,
+        stream_name,
+        record,
+        lines_field,
+        lines,
+        line_model,
+        parent_field,
+        context=None,
     ):
-        password = str(self._config.get("password"))
-        db = self._config.get("db")
-        # Log all of the payloads except for the attachments
-        if stream_name != "ir.attachment":
-            self.logger.info(f" Updating {self.name}: {stream_name} - {record}")
+        """Create a record and its one2many lines in a single `create` call.
+
+        `lines` is a list of `(index, vals)` tuples. If the combined create is
+        rejected, the record is created on its own and the lines are retried
+        one by one so the failing ones can be reported. Returns the new id and
+        the list of failed lines.
+        """
+        payload = dict(record)
+        payload[lines_field] = [(0, 0, vals) for _, vals in lines]
+        record_id = self._post_odoo(stream_name, payload, context)
+        if record_id or not lines:
+            return record_id, []
+
+        self.logger.warning(
+            f"Creating {stream_name} with {len(lines)} lines failed. "
+            "Retrying lines individually."
+        )
+        record_id = self._post_odoo(stream_name, record, context)
+        if not record_id:
+            return record_id, []
+        failed_lines = []
+        for index, vals in lines:
+            try:
+                self.execute_kw(
+                    line_model,
+                    "create",
+                    [dict(vals, **{parent_field: record_id})],
+                    {"context": context or {"lang": "en_US"}},
+                )
+            except xmlrpc.client.Fault as error:
+                failed_lines.append({"index": index, "error": error.faultString})
+        return record_id, failed_lines
 
-        models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
-        self.models = models
-        if context is None:
-            context_dictionary = {"lang": "en_US"}
-        else:
-            context_dictionary = context
-        if update_id:
-            record = [[update_id], record]
-        else:
-            record = [record]
-        if action == "action_post":
-            record = [[update_id]]
+    def create_with_line_chunks(
+        self,
+        stream_name,
+        record,
+        lines_field,
+        chunks,
+        line_model,
+        parent_field,
+        on_created=None,
+    ):
+        """Create a record with its first chunk of lines, then append the rest.
+
+        `chunks` yields `(lines, context)`, with `lines` as in
+        `create_with_lines`, and is consumed one chunk at a time.
+        `on_created` is called with the new id once the record exists.
+        Returns the new id and the list of failed lines.
+        """
+        chunks = iter(chunks)
+        lines, context = next(chunks, ([], None))
+        record_id, failed_lines = self.create_with_lines(
+            stream_name, record, lines_field, lines, line_model, parent_field, context
+        )
+        if not record_id:
+            return record_id, failed_lines
+        if on_created is not None:
+            on_created(record_id)
+        for lines, context in chunks:
+            failed_lines += self.append_lines(
+                stream_name,
+                record_id,
+                lines_field,
+                lines,
+                line_model,
+                parent_field,
+                context,
+            )
+        return record_id, failed_lines
+
+    @timed("create")
+    def append_lines(
+        self,
+        stream_name,
+        record_id,
+        lines_field,
+        lines,
+        line_model,
+        parent_field,
+        context=None,
+    ):
+        """Add lines to an existing record with one `write` of `(0, 0, vals)`.
+
+        Lines of a rejected write are retried one by one. Returns the list of
+        failed lines.
+        """
+        if not lines:
+            return []
+        commands = [(0, 0, vals) for _, vals in lines]
+        self.log_payload("Updating", stream_name, [[record_id], {lines_field: commands}])
         try:
-            res = models.execute_kw(
-                db,
-                self.uid,
-                str(password),
+            self.execute_kw(
                 stream_name,
-                action,
-                record,
-                {"context": context_dictionary},
+                "write",
+                [[record_id], {lines_field: commands}],
+                {"context": context or {"lang": "en_US"}},
             )
-            return res
+            return []
         except xmlrpc.client.Fault as error:
-            self.logger.warning(error.faultString)
+            self.logger.warning(
+                f"Adding {len(lines)} lines to {stream_name} {record_id} failed: "
+                f"{error.faultString}. Retrying lines individually."
+            )
+        failed_lines = []
+        for index, vals in lines:
+            try:
+                self.execute_kw(
+                    line_model,
+                    "create",
+                    [dict(vals, **{parent_field: record_id})],
+                    {"context": context or {"lang": "en_US"}},
+                )
+            except xmlrpc.client.Fault as error:
+                failed_lines.append({"index": index, "error": error.faultString})
+        return failed_lines
+
+    def order_line_chunks(self, line_items, key, field, failed_lines):
+        """Map order lines `line_chunk_size` items at a time.
+
+        Yields `(lines, None)` chunks for `create_with_line_chunks`, lines
+        that can't be mapped are added to `failed_lines`.
+        """
+        start = 0
+        for chunk in chunked(iter_line_items(line_items), self.line_chunk_size):
+            self.prefetch_products(chunk, key, field)
+            lines, failed = self.map_order_lines(chunk, start)
+            failed_lines.extend(failed)
+            start += len(chunk)
+            yield lines, None
 
     def read_odoo(self, stream_name, record_id, fields=[]):
-        return self.models.execute_kw(
-            self.db,
-            self.uid,
-            str(self.password),
+        return self.execute_kw(
             stream_name,
             "read",
             [[record_id]],
             {"fields": fields},
         )
 
-    def get_tax_list(self):
-        if not self.tax_list:
-            taxes = self.get_odoo_taxes()
-            self.tax_list = {i["name"]: i for i in taxes}
-        return self.tax_list
-
-    def get_tax_group_list(self):
-        if not self.tax_group_list:
-            taxes = self.query_odoo("account.tax.group", [])
-            self.tax_group_list = {i["name"]: i for i in taxes}
-        return self.tax_group_list
-
     def get_tax_id(self, tax_name):
-        taxes = self.get_tax_list()
-        if tax_name in tax_name:
-            return taxes[tax_name]
+        taxes = self.taxes.get("name", tax_name)
+        if len(taxes) > 0:
+            return taxes[0]
         return {}
 
     def get_tax_group_id(self, tax_name):
-        taxes = self.get_tax_group_list()
-        if tax_name in taxes:
-            return taxes[tax_name]
+        groups = self.tax_groups.get("name", tax_name)
+        if len(groups) > 0:
+            return groups[0]
         return {}
 
     def preprocess_record(self, record: dict, context: dict) -> dict:
@@ -206,57 +575,120 @@ class OdooV3Sink(HotglueSink):
 class TaxRates(OdooV3Sink):
     endpoint = "TaxRates"
     name = "TaxRates"
+    references = True
 
-    def upsert_record(self, record: dict, context: dict):
-        taxes = self.get_tax_list()
-        groups = self.get_tax_group_list()
-        status = True
-        state_updates = dict()
-        if taxes and groups is not None:
-            if bool(record.get("is_percent")):
-                amount_type = "percent"
+    def map_tax(self, record):
+        if bool(record.get("is_percent")):
+            amount_type = "percent"
+        else:
+            # set default tax type
+            amount_type = "fixed"
+        # default to tax use to purchase for now.
+        payload = {
+            "name": record.get("name"),
+            "amount_type": amount_type,
+            "amount": record.get("value"),
+            "type_tax_use": "purchase",
+        }
+        if record.get("tax_type"):
+            tax_group = self.get_tax_group_id(record.get("tax_type"))
+            if "id" in tax_group:
+                payload.update({"tax_group_id": tax_group["id"]})
+        return payload
+
+    def process_batch_records(self, items):
+        """Create the new tax rates of a flush with one call.
+
+        Rates already in Odoo, or repeated in the batch, are reported as
+        existing. Created rates go into the shared tax index, so invoice
+        lines resolve them without refetching `account.tax`.
+        """
+        records = [item["record"] for item in items]
+        results = [None] * len(items)
+        payloads = {}
+        names = {}
+        for index, record in enumerate(records):
+            try:
+                existing = self.get_tax_id(record.get("name"))
+            except Exception as e:
+                return self.upsert_each(items, [None] * len(items), e)
+            if existing:
+                self.logger.info(f"TaxRate {record.get('name')} already exists.")
+                results[index] = (existing["id"], True, {"existing": True})
+            elif record.get("name") in names:
+                names[record.get("name")].append(index)
             else:
-                # set default tax type
-                amount_type = "Fixed"
-            if record["name"] not in taxes:
-                # default to tax use to purchase for now.
-                payload = {
-                    "name": record.get("name"),
-                    "amount_type": amount_type,
-                    "amount": record.get("value"),
-                    "type_tax_use": "purchase",
-                }
-                if record.get("tax_type"):
-                    tax_group = self.get_tax_group_id(record.get("tax_type"))
-                    if "id" in tax_group:
-                        payload.update({"tax_group_id": tax_group["id"]})
-                tax_id = self._post_odoo("account.tax", payload)
+                try:
+                    payloads[index] = self.map_tax(record)
+                except Exception as e:
+                    self.logger.exception(f"Upsert record error {str(e)}")
+                    results[index] = (None, False, {"error": str(e)})
+                    continue
+                names[record.get("name")] = [index]
+
+        try:
+            ids = self._post_odoo_many("account.tax", list(payloads.values()))
+        except Exception as e:
+            for indexes in names.values():
+                for index in indexes:
+                    results[index] = (None, False, {"error": unknown_outcome(e)})
+            return results
+        for (index, payload), tax_id in zip(payloads.items(), ids):
+            name = payload["name"]
+            if tax_id:
+                self.taxes.add(dict(payload, id=tax_id))
+                self.logger.info(
+                    f"TaxRate {name} with id {tax_id} added to list of tax rates."
+                )
+                results[index] = (tax_id, True, {"success": True})
+            else:
+                results[index] = (None, False, {"success": False})
+            for duplicate in names[name][1:]:
                 if tax_id:
-                    state_updates["success"] = True
+                    results[duplicate] = (tax_id, True, {"existing": True})
                 else:
-                    state_updates["success"] = False
-                    status = False
-                print(
-                    f"TaxRate {record.get('name')} with id {tax_id} added to list of tax rates."
-                )
+                    results[duplicate] = (None, False, {"success": False})
+        return results
+
+    def upsert_record(self, record: dict, context: dict):
+        return self.process_batch_records([{"record": record, "context": context}])[0]
 
-        id = tax_id
-        return id, status, state_updates
+
+# Partner fields compared when `update_vendors` is enabled. They are part of
+# the default `res.partner` projection, so the batch prefetch reads them.
+VENDOR_UPDATE_FIELDS = [
+    "email",
+    "phone",
+    "street",
+    "street2",
+    "city",
+    "country_id",
+    "company_name",
+]
 
 
 class Vendors(OdooV3Sink):
     endpoint = "Vendors"
     name = "Vendors"
+    references = True
 
-    def process_vendors(self, record):
-        mapping = UnifiedMapping()
-        payload = mapping.prepare_payload(record, "vendors")
-        payload["company_type"] = "company"
-        payload["supplier_rank"] = 1
-        lookup = self.find_company(payload["name"], payload["company_type"])
+    def map_vendor(self, record, payload=None):
+        """Build the `res.partner` payload, None if the vendor already exists."""
+        if payload is None:
+            payload = get_mapper("vendors").map(record)
+        lookup = self.find_company(payload["name"], "company")
         if len(lookup) > 0:
             self.logger.info(f"Supplier {payload['name']} already exists. Skipping...")
             return None
+        return self.vendor_payload(record, payload)
+
+    @timed("map")
+    def vendor_payload(self, record, payload=None):
+        """Build the `res.partner` payload of a vendor, resolving references."""
+        if payload is None:
+            payload = get_mapper("vendors").map(record)
+        payload["company_type"] = "company"
+        payload["supplier_rank"] = 1
         if payload.get("company_name"):
             company = self.find_company(payload["company_name"])
             if len(company) > 0:
@@ -274,19 +706,87 @@ class Vendors(OdooV3Sink):
                 payload["country_id"] = country["id"]
             else:
                 del payload["country_code"]
-        return self._post_odoo("res.partner", payload)
+        return payload
 
-    def upsert_record(self, record: dict, context: dict):
-        status = True
-        state_updates = dict()
+    def process_batch_records(self, items):
+        records = [item["record"] for item in items]
+        try:
+            self.prefetch_partners(
+                [r.get("vendorName") for r in records]
+                + [r.get("contactName") for r in records]
+            )
+        except Exception as e:
+            return self.upsert_each(items, [None] * len(items), e)
+        results = [(None, False, {"success": False}) for _ in items]
+        try:
+            mapped = get_mapper("vendors").map_many(records)
+        except Exception:
+            # Map record by record so the failing one is reported alone.
+            mapped = [None] * len(records)
+        update_vendors = self.config.get("update_vendors", False)
+        payloads = {}
+        updates = {}
+        names = set()
+        for index, record in enumerate(records):
+            try:
+                if update_vendors:
+                    payload = self.vendor_payload(record, mapped[index])
+                    existing = self.find_company(payload["name"], "company")
+                    if existing:
+                        updates[index] = (existing[0], payload)
+                        continue
+                else:
+                    payload = self.map_vendor(record, mapped[index])
+            except Exception as e:
+                self.logger.exception(f"Upsert record error {str(e)}")
+                results[index] = (None, False, {"error": str(e)})
+                continue
+            if payload is None:
+                continue
+            if payload["name"] in names:
+                self.logger.info(
+                    f"Supplier {payload['name']} already exists. Skipping..."
+                )
+                continue
+            names.add(payload["name"])
+            payloads[index] = payload
 
-        id = self.process_vendors(record)
-        if id:
-            state_updates["success"] = True
-        else:
-            state_updates["success"] = False
-            status = False
-        return id, status, state_updates
+        try:
+            ids = self._post_odoo_many("res.partner", list(payloads.values()))
+        except Exception as e:
+            ids = [None] * len(payloads)
+            for index in payloads:
+                results[index] = (None, False, {"error": unknown_outcome(e)})
+        for (index, payload), partner_id in zip(payloads.items(), ids):
+            if partner_id:
+                # Later records (e.g. bills for this vendor) resolve it from cache.
+                self.partners.add(dict(payload, id=partner_id))
+                results[index] = (partner_id, True, {"success": True})
+
+        # Unchanged partners cost nothing, the others share grouped writes.
+        changes = {}
+        for index, (partner, payload) in updates.items():
+            changes[index] = changed_fields(partner, payload, VENDOR_UPDATE_FIELDS)
+            if not changes[index]:
+                results[index] = (partner["id"], True, {"existing": True})
+        failed = self._update_odoo_many(
+            "res.partner",
+            [(updates[i][0]["id"], c) for i, c in changes.items() if c],
+        )
+        for index, partner_changes in changes.items():
+            partner = updates[index][0]
+            if not partner_changes:
+                continue
+            if partner["id"] in failed:
+                results[index] = (partner["id"], False, {"success": False})
+                continue
+            # Keep the cached partner in line with Odoo.
+            partner.update(partner_changes)
+            results[index] = (partner["id"], True, {"is_updated": True})
+        return results
+
+    def upsert_record(self, record: dict, context: dict):
+        return self.process_batch_records([{"record": record, "context": context}])[0]
 
 
 class Suppliers(Vendors):
@@ -297,7 +797,9 @@ class Suppliers(Vendors):
 class PurchaseInvoices(OdooV3Sink):
     endpoint = "PurchaseInvoices"
     name = "BuyOrders"
+    concurrent = True
 
+    @timed("map")
     def map_purchase_order(self, record):
         export_buy_orders_as_draft = self.config.get("export_buy_orders_as_draft", False)
         if export_buy_orders_as_draft:
@@ -332,59 +834,100 @@ class PurchaseInvoices(OdooV3Sink):
 
         return record_processed
 
+    @timed("map")
+    def map_order_lines(self, line_items, start=0):
+        lines = []
+        failed_lines = []
+        for index, rec in enumerate(line_items, start):
+            line_rec = {}
+            # Get matching product in Odoo
+            product = self.find_product(rec["product_remoteId"], "id")
+            if len(product) == 0:
+                failed_lines.append(
+                    {
+                        "index": index,
+                        "product": rec.get("product_remoteId"),
+                        "error": "Product not found",
+                    }
+                )
+                continue
+            product = product[0]
+            line_rec["product_id"] = product["id"]
+            line_rec["name"] = product["name"]
+            line_rec["product_qty"] = rec["quantity"]
+
+            # Calculate unit price from sub_total_price
+            if rec.get("sub_total_price") and rec.get("quantity"):
+                try:
+                    sub_total = float(rec["sub_total_price"])
+                    quantity = float(rec["quantity"])
+                    if quantity > 0:
+                        line_rec["price_unit"] = sub_total / quantity
+                    else:
+                        self.logger.warning(f"Invalid quantity {quantity} for product {rec.get('product_remoteId')}, skipping price calculation")
+                except (ValueError, TypeError) as e:
+                    self.logger.warning(f"Error calculating unit price for product {rec.get('product_remoteId')}: {e}")
+            lines.append((index, line_rec))
+        return lines, failed_lines
+
+    def process_batch_records(self, items):
+        # Resolve the suppliers of the whole batch with one query.
+        try:
+            self.prefetch_partners(
+                [
+                    item["record"].get("supplier_name")
+                    for item in items
+                    if not item["record"].get("supplier_remoteId")
+                ]
+            )
+        except Exception as e:
+            return self.upsert_each(items, [None] * len(items), e)
+        return super().process_batch_records(items)
+
     def process_purchase_invoice(self, record):
         record_processed = self.map_purchase_order(record)
-        # Create the purchase order
-        stream_name = "purchase.order"
-        order_id = self._post_odoo(stream_name, record_processed)
-
-        if order_id:
-            # Add the line items to the order
-            line_items = record.get("line_items")
-
-            if line_items:
-                # If line item is string, convert to dict
-                if isinstance(line_items, str):
-                    line_items = json.loads(line_items)
-
-                # Build the lines
-                for rec in line_items:
-                    line_rec = {}
-                    line_rec["order_id"] = order_id
-                    # Get matching product in Odoo
-                    product = self.find_product(rec["product_remoteId"], "id")
-                    if len(product) > 0:
-                        product = product[0]
-                        line_rec["product_id"] = product["id"]
-                        line_rec["name"] = product["name"]
-                        line_rec["product_qty"] = rec["quantity"]
-                        
-                        # Calculate unit price from sub_total_price
-                        if rec.get("sub_total_price") and rec.get("quantity"):
-                            try:
-                                sub_total = float(rec["sub_total_price"])
-                                quantity = float(rec["quantity"])
-                                if quantity > 0:
-                                    line_rec["price_unit"] = sub_total / quantity
-                                else:
-                                    self.logger.warning(f"Invalid quantity {quantity} for product {rec.get('product_remoteId')}, skipping price calculation")
-                            except (ValueError, TypeError) as e:
-                                self.logger.warning(f"Error calculating unit price for product {rec.get('product_remoteId')}: {e}")
-                        
-                        # Post the line to Odoo
-                        self._post_odoo(f"{stream_name}.line", line_rec)
-        return order_id
+        line_items = record.get("line_items") or []
+        if self.line_chunk_size:
+            # Large documents are mapped and sent a chunk of lines at a time.
+            failed_lines = []
+            order_id, failed = self.create_with_line_chunks(
+                "purchase.order",
+                record_processed,
+                "order_line",
+                self.order_line_chunks(line_items, "product_remoteId", "id", failed_lines),
+                "purchase.order.line",
+                "order_id",
+            )
+            return order_id, failed_lines + failed
+        # If line item is string, convert to dict
+        if isinstance(line_items, str):
+            line_items = json.loads(line_items)
+        self.prefetch_products(line_items, "product_remoteId", "id")
+        lines, failed_lines = self.map_order_lines(line_items)
+        # Create the purchase order together with its lines
+        order_id, failed = self.create_with_lines(
+            "purchase.order",
+            record_processed,
+            "order_line",
+            lines,
+            "purchase.order.line",
+            "order_id",
+        )
+        return order_id, failed_lines + failed
 
     def upsert_record(self, record: dict, context: dict):
         status = True
         state_updates = dict()
 
-        id = self.process_purchase_invoice(record)
+        id, failed_lines = self.process_purchase_invoice(record)
         if id:
             state_updates["success"] = True
         else:
             state_updates["success"] = False
             status = False
+        if failed_lines:
+            self.logger.warning(f"{self.name} {id}: failed lines {failed_lines}")
+            state_updates["failed_lines"] = failed_lines
         return id, status, state_updates
 
 
@@ -392,6 +935,7 @@ class PurchaseOrder(OdooV3Sink):
     endpoint = "PurchaseInvoices"
     name = "PurchaseOrder"
 
+    @timed("map")
     def map_purchase_order(self, record):
         record_processed = {"state": "purchase"}
         # Get the supplier in odoo
@@ -410,77 +954,187 @@ class PurchaseOrder(OdooV3Sink):
 
         return record_processed
 
+    @timed("map")
+    def map_order_lines(self, line_items, start=0):
+        lines = []
+        failed_lines = []
+        for index, rec in enumerate(line_items, start):
+            line_rec = {}
+            # Get matching product in Odoo
+            product = self.find_product(rec["productName"])
+            if len(product) == 0:
+                failed_lines.append(
+                    {
+                        "index": index,
+                        "product": rec.get("productName"),
+                        "error": "Product not found",
+                    }
+                )
+                continue
+            product = product[0]
+            line_rec["product_id"] = product["id"]
+            line_rec["name"] = product["name"]
+            line_rec["price_unit"] = rec["unitPrice"]
+            line_rec["product_qty"] = rec["quantity"]
+            line_rec["price_total"] = rec["totalPrice"]
+            if rec.get("product_uom_qty"):
+                line_rec["product_uom_qty"] = int(rec["product_uom_qty"])
+            lines.append((index, line_rec))
+        return lines, failed_lines
+
+    def process_batch_records(self, items):
+        # Resolve the suppliers of the whole batch with one query.
+        try:
+            self.prefetch_partners(
+                [item["record"].get("supplierName") for item in items]
+            )
+        except Exception as e:
+            return self.upsert_each(items, [None] * len(items), e)
+        return super().process_batch_records(items)
+
     def process_purchase_invoice(self, record):
         record_processed = self.map_purchase_order(record)
-        # Create the purchase order
-        stream_name = "purchase.order"
-        order_id = self._post_odoo(stream_name, record_processed)
-
-        if order_id:
-            # Add the line items to the order
-            line_items = record.get("lineItems")
-
-            if line_items:
-                # If line item is string, convert to dict
-                if isinstance(line_items, str):
-                    line_items = json.loads(line_items)
-
-                # Build the lines
-                for rec in line_items:
-                    line_rec = {}
-                    line_rec["order_id"] = order_id
-                    # Get matching product in Odoo
-                    product = self.find_product(rec["productName"])
-                    if len(product) > 0:
-                        product = product[0]
-                        line_rec["product_id"] = product["id"]
-                        line_rec["name"] = product["name"]
-                        line_rec["price_unit"] = rec["unitPrice"]
-                        line_rec["product_qty"] = rec["quantity"]
-                        line_rec["price_total"] = rec["totalPrice"]
-                        if rec.get("product_uom_qty"):
-                            line_rec["product_uom_qty"] = int(rec["product_uom_qty"])
-                        # Post the line to Odoo
-                        self._post_odoo(f"{stream_name}.line", line_rec)
-        return order_id
+        line_items = record.get("lineItems") or []
+        if self.line_chunk_size:
+            # Large documents are mapped and sent a chunk of lines at a time.
+            failed_lines = []
+            order_id, failed = self.create_with_line_chunks(
+                "purchase.order",
+                record_processed,
+                "order_line",
+                self.order_line_chunks(line_items, "productName", "name", failed_lines),
+                "purchase.order.line",
+                "order_id",
+            )
+            return order_id, failed_lines + failed
+        # If line item is string, convert to dict
+        if isinstance(line_items, str):
+            line_items = json.loads(line_items)
+        self.prefetch_products(line_items, "productName")
+        lines, failed_lines = self.map_order_lines(line_items)
+        # Create the purchase order together with its lines
+        order_id, failed = self.create_with_lines(
+            "purchase.order",
+            record_processed,
+            "order_line",
+            lines,
+            "purchase.order.line",
+            "order_id",
+        )
+        return order_id, failed_lines + failed
 
     def upsert_record(self, record: dict, context: dict):
         status = True
         state_updates = dict()
 
-        id = self.process_purchase_invoice(record)
+        id, failed_lines = self.process_purchase_invoice(record)
         if id:
             state_updates["success"] = True
         else:
             state_updates["success"] = False
             status = False
+        if failed_lines:
+            self.logger.warning(f"{self.name} {id}: failed lines {failed_lines}")
+            state_updates["failed_lines"] = failed_lines
         return id, status, state_updates
 
 
+# Move fields compared on updates, state is changed through actions only.
+MOVE_UPDATE_FIELDS = [
+    "ref",
+    "partner_id",
+    "invoice_date",
+    "invoice_date_due",
+    "currency_id",
+]
+MOVE_LINE_UPDATE_FIELDS = [
+    "product_id",
+    "name",
+    "quantity",
+    "price_unit",
+    "discount",
+    "account_id",
+    "tax_ids",
+]
+
+
 class Invoices(OdooV3Sink):
     endpoint = "Invoices"
     name = "Invoices"
+    inv_type = "out_invoice"
+    contact_key = "customerName"
+    concurrent = True
+
+    def __init__(
+        self,
+        target: PluginBase,
+        stream_name: str,
+        schema: Dict,
+        key_properties: Optional[List[str]],
+    ) -> None:
+        super().__init__(target, stream_name, schema, key_properties)
+        self.attachment_uploader = AttachmentUploader(
+            int(self.config.get("attachment_workers") or DEFAULT_WORKERS),
+            int(
+                self.config.get("attachment_max_inflight_bytes")
+                or DEFAULT_MAX_INFLIGHT_BYTES
+            ),
+        )
+        # Optional record of created moves, see `target_odoo_v3.journal`.
+        self.journal = get_journal(self.config)
+
+    def clean_up(self) -> None:
+        self.attachment_uploader.close()
+        super().clean_up()
 
     def get_line_items(self, invoice_id):
-        return self.models.execute_kw(
-            self.db,
-            self.uid,
-            str(self.password),
+        # Accepts a list of ids to read the lines of several moves at once.
+        invoice_ids = invoice_id if isinstance(invoice_id, list) else [invoice_id]
+        return self.execute_kw(
             "account.move.line",
             "search_read",
-            [[("move_id", "=", invoice_id)]],
+            [[("move_id", "in", invoice_ids)]],
             {
                 "fields": [
                     "id",
+                    "move_id",
                     "name",
                     "product_id",
                     "quantity",
                     "price_unit",
+                    "discount",
                     "account_id",
+                    "tax_ids",
                 ]
             },
         )
 
+    @timed("lookup")
+    def read_moves(self, move_ids):
+        """Read moves and their invoice lines, keyed by move id.
+
+        Two calls for any number of moves. Lines keep the order of the move's
+        `invoice_line_ids`, tax and payment term lines are left out.
+        """
+        if not move_ids:
+            return {}
+        moves = self.execute_kw(
+            "account.move",
+            "search_read",
+            [[["id", "in", move_ids], ["move_type", "=", self.inv_type]]],
+            {"fields": ["id", "state", "invoice_line_ids"] + MOVE_UPDATE_FIELDS},
+        )
+        if not moves:
+            return {}
+        lines = {line["id"]: line for line in self.get_line_items(move_ids)}
+        return {
+            move["id"]: (
+                move,
+                [lines[i] for i in move.get("invoice_line_ids") or [] if i in lines],
+            )
+            for move in moves
+        }
+
     def get_invoice_attachments(self, invoice_id):
         invoice = self.read_odoo(
             "account.move", invoice_id, ["id", "name", "attachment_ids"]
@@ -489,10 +1143,7 @@ class Invoices(OdooV3Sink):
             attachment_ids = invoice[0].get("attachment_ids", [])
 
             # Retrieve the attachment records
-            attachments = self.models.execute_kw(
-                self.db,
-                self.uid,
-                str(self.password),
+            attachments = self.execute_kw(
                 "ir.attachment",
                 "search_read",
                 [[("id", "in", attachment_ids)]],
@@ -501,23 +1152,64 @@ class Invoices(OdooV3Sink):
             return attachments
         return []
 
+    @timed("attach")
     def upload_attachment(self, record_id, document_id, document_name):
         input_path = self.config.get("input_path", "./")
         file_name = os.path.join(input_path, f"{document_id}_{document_name}")
         if os.path.isfile(file_name):
-            with open(file_name, "rb") as f:
-                document_content = f.read()
-            # document_content = xmlrpc.client.Binary(document_content)
-            document_content = base64.b64encode(document_content).decode("utf-8")
+            # The file is base64 encoded chunk by chunk straight into the request.
+            document_content = Base64FileStream(file_name)
 
             payload = {
                 "name": f"{document_id}_{document_name}",
-                "datas": document_content,
+                "datas": document_content.placeholder,
                 "res_model": "account.move",
                 "res_id": record_id,
             }
-            attachment = self._post_odoo("ir.attachment", payload)
-            return attachment
+            try:
+                return self.session.execute_kw_streamed(
+                    "ir.attachment",
+                    "create",
+                    [payload],
+                    {"context": {"lang": "en_US"}},
+                    document_content,
+                )
+            except xmlrpc.client.Fault as error:
+                self.logger.warning(error.faultString)
+            except Exception as error:
+                # The move exists, a lost upload is retried by the next run.
+                self.logger.warning(
+                    f"Uploading {payload['name']} to {record_id} failed: {error!r}"
+                )
+
+    def upload_attachments(self, record_id, attachments, check_existing=False):
+        """Queue the attachments of a move for upload, return their futures.
+
+        With `check_existing`, files already attached to the move are skipped.
+        """
+        input_path = self.config.get("input_path", "./")
+        existing = set()
+        if check_existing:
+            existing = {a["name"] for a in self.get_invoice_attachments(record_id)}
+        futures = []
+        for attachment in attachments:
+            name = f"{attachment.get('id')}_{attachment.get('name')}"
+            if name in existing:
+                self.logger.info(f"Attachment {name} already on {record_id}. Skipping...")
+                continue
+            file_name = os.path.join(input_path, name)
+            if not os.path.isfile(file_name):
+                continue
+            futures.append(
+                self.attachment_uploader.submit(
+                    os.path.getsize(file_name),
+                    self.upload_attachment,
+                    record_id,
+                    attachment.get("id"),
+                    attachment.get("name"),
+                )
+            )
+        return futures
 
     def map_invoice(self, record, contact_key):
         record_processed = {"state": record["status"].lower()}
@@ -537,10 +1229,30 @@ class Invoices(OdooV3Sink):
 
         return record_processed
 
-    def process_invoice(
-        self, record, inv_type="out_invoice", contact_key="customerName"
+    @timed("lookup")
+    def prefetch_batch(self, records, contact_key):
+        # Resolve partners and products of the whole batch up front.
+        self.prefetch_partners([record.get(contact_key) for record in records])
+        if self.line_chunk_size:
+            # Products are prefetched per chunk of lines instead.
+            return
+        line_items = []
+        for record in records:
+            if isinstance(record.get("lineItems"), str):
+                record["lineItems"] = json.loads(record["lineItems"])
+            line_items.extend(record.get("lineItems") or [])
+        self.prefetch_products(line_items, "productName")
+
+    @timed("map")
+    def prepare_invoice(
+        self, record, inv_type="out_invoice", contact_key="customerName", lines=True
     ):
-        stream_name = "account.move"
+        """Map a record into an `account.move` payload.
+
+        Returns `(payload, context, mark_posted)`, or None when the record
+        can't be created. With `lines=False` the payload has no lines, they
+        are left to `invoice_line_chunks`.
+        """
         record_processed = self.map_invoice(record, contact_key)
         # Don't wish to affect Invoices stream yet.
         record_processed["ref"] = record_processed["name"]
@@ -552,145 +1264,424 @@ class Invoices(OdooV3Sink):
         context_dictionary = None
         currency_id = self.find_currency(record["currency"])
         if currency_id is None:
-            print("Currency not found. Skipping..")
+            self.logger.warning(f"Currency {record['currency']} not found. Skipping..")
             return
         currency_id = currency_id["id"]
         record_processed["move_type"] = inv_type
         record_processed["payment_state"] = "not_paid"
         record_processed["currency_id"] = currency_id
 
-        verify_ref = self.config.get("verify_ref", False)
-        if verify_ref:
-            inv = self.find_invoice(record_processed["ref"])
-            if len(inv) > 0:
-                self.logger.warning(
-                    f"Invoice with ref: {record_processed['ref']} found. Skipping..."
-                )
-
         # Create the Invoice
         record_processed["invoice_line_ids"] = []
         # Add the line items to the order
         line_items = record.get("lineItems")
 
-        if line_items:
+        if not line_items:
+            return
+        if not lines:
+            return record_processed, context_dictionary, mark_posted
+
+        # If line item is string, convert to dict
+        if isinstance(line_items, str):
+            line_items = json.loads(line_items)
+        self.prefetch_products(line_items, "productName")
+
+        # Build the lines
+        for rec in line_items:
+            line = self.map_invoice_line(rec, currency_id)
+            if line is None:
+                continue
+            line_rec, line_context = line
+            if line_context:
+                context_dictionary = line_context
+            record_processed["invoice_line_ids"].append((0, 0, line_rec))
+
+        return record_processed, context_dictionary, mark_posted
+
+    def map_invoice_line(self, rec, currency_id):
+        """Map a line item, returns `(vals, context)` or None to skip it."""
+        line_rec = {}
+        context_dictionary = None
+        # line_rec["move_id"] = order_id
+        # Get matching product in Odoo
+        product = self.find_product(rec["productName"])
+        if len(product) > 0:
+            product = product[0]
+        else:
+            product = {}
+        if rec.get("accountNumber"):
+            account_id = self.find_account(rec["accountNumber"], "code")
+        elif rec.get("accountName"):
+            account_id = self.find_account(rec["accountName"])
+        else:
+            account_id = []
+        if len(account_id) == 0:
+            self.logger.warning("Valid Account name required. Skipping..")
+            # skip the line
+            return
+        account_id = account_id[0]["id"]
+        if product.get("id"):
+            line_rec["product_id"] = product.get("id")
+
+        if product.get("name"):
+            line_rec["name"] = product.get("name")
+        elif rec.get("productName"):
+            line_rec["name"] = rec.get("productName")
+        line_rec["price_unit"] = rec.get("unitPrice")
+        line_rec["quantity"] = rec.get("quantity")
+        line_rec["price_subtotal"] = rec.get("totalPrice")
+        line_rec["discount"] = rec.get("discountAmount", 0)
+
+        if "displayType" in rec:
+            line_rec["display_type"] = rec["displayType"]
+            if rec["displayType"] is False:
+                context_dictionary = {
+                    "lang": "en_US",
+                    "check_move_validity": False,
+                }
+        else:
+            # Default to product according to unified schema
+            line_rec["display_type"] = "product"
+
+        # TODO map these when required.
+        # line_rec["debit"] = 1
+        # line_rec["credit"] = 0
+        # line_rec["tax_repartition_line_id"] = False
+        # line_rec["tax_exigible"] = False
+        # line_rec["recompute_tax_line"] = False
+        # line_rec["predict_from_name"] = False
+        # line_rec["is_rounding_line"] = False
+        # line_rec["exclude_from_invoice_tab"] = False
+        # line_rec["account_internal_type"] = "other"
+        # line_rec["account_internal_group"] = "expense"
+
+        line_rec["currency_id"] = currency_id
+        if rec.get("taxCode"):
+            tax_detail = self.get_tax_id(rec.get("taxCode"))
+            if "id" in tax_detail:
+                line_rec["tax_ids"] = [tax_detail["id"]]  # [3,34]
+
+        line_rec["account_id"] = account_id
+        if rec.get("product_uom_qty"):
+            line_rec["product_uom_qty"] = int(rec["product_uom_qty"])
+        return line_rec, context_dictionary
+
+    def invoice_line_chunks(self, line_items, currency_id, skip=0):
+        """Map invoice lines `line_chunk_size` items at a time.
+
+        Yields `(lines, context)` chunks for `create_with_line_chunks`, the
+        context disabling the move validity check when a line of the chunk
+        needs it. The first `skip` mapped lines are left out.
+        """
+        size = self.line_chunk_size or DEFAULT_LINE_CHUNK_SIZE
+        start = 0
+        for chunk in chunked(iter_line_items(line_items), size):
+            with get_metrics().timer(self.name, "map"):
+                self.prefetch_products(chunk, "productName")
+                lines, context_dictionary = [], None
+                for index, rec in enumerate(chunk, start):
+                    line = self.map_invoice_line(rec, currency_id)
+                    if line is None:
+                        continue
+                    if skip:
+                        skip -= 1
+                        continue
+                    line_rec, line_context = line
+                    if line_context:
+                        context_dictionary = line_context
+                    lines.append((index, line_rec))
+            start += len(chunk)
+            if lines:
+                yield lines, context_dictionary
+
+    def finalize_invoice(self, order_id, record, mark_posted, check_existing=False):
+        # Handle attachments, uploads run while the move is being posted.
+        uploads = []
+        if record.get("attachments"):
             # If line item is string, convert to dict
-            if isinstance(line_items, str):
-                line_items = json.loads(line_items)
-
-            # Build the lines
-            for rec in line_items:
-                line_rec = {}
-                # line_rec["move_id"] = order_id
-                # Get matching product in Odoo
-                product = self.find_product(rec["productName"])
-                if len(product) > 0:
-                    product = product[0]
-                else:
-                    product = {}
-                if rec.get("accountNumber"):
-                    account_id = self.find_account(rec["accountNumber"], "code")
-                elif rec.get("accountName"):
-                    account_id = self.find_account(rec["accountName"])
-                else:
-                    account_id = []
-                if len(account_id) == 0:
-                    print("Valid Account name required. Skipping..")
-                    # skip the line
-                    continue
-                account_id = account_id[0]["id"]
-                if product.get("id"):
-                    line_rec["product_id"] = product.get("id")
-
-                if product.get("name"):
-                    line_rec["name"] = product.get("name")
-                elif rec.get("productName"):
-                    line_rec["name"] = rec.get("productName")
-                line_rec["price_unit"] = rec.get("unitPrice")
-                line_rec["quantity"] = rec.get("quantity")
-                line_rec["price_subtotal"] = rec.get("totalPrice")
-                line_rec["discount"] = rec.get("discountAmount", 0)
-
-                if "displayType" in rec:
-                    line_rec["display_type"] = rec["displayType"]
-                    if rec["displayType"] is False:
-                        context_dictionary = {
-                            "lang": "en_US",
-                            "check_move_validity": False,
-                        }
-                else:
-                    # Default to product according to unified schema
-                    line_rec["display_type"] = "product"
-
-                # TODO map these when required.
-                # line_rec["debit"] = 1
-                # line_rec["credit"] = 0
-                # line_rec["tax_repartition_line_id"] = False
-                # line_rec["tax_exigible"] = False
-                # line_rec["recompute_tax_line"] = False
-                # line_rec["predict_from_name"] = False
-                # line_rec["is_rounding_line"] = False
-                # line_rec["exclude_from_invoice_tab"] = False
-                # line_rec["account_internal_type"] = "other"
-                # line_rec["account_internal_group"] = "expense"
-
-                line_rec["currency_id"] = currency_id
-                if rec.get("taxCode"):
-                    tax_detail = self.get_tax_id(rec.get("taxCode"))
-                    if "id" in tax_detail:
-                        line_rec["tax_ids"] = [tax_detail["id"]]  # [3,34]
-
-                line_rec["account_id"] = account_id
-                if rec.get("product_uom_qty"):
-                    line_rec["product_uom_qty"] = int(rec["product_uom_qty"])
-                # Post the line to Odoo
-                record_processed["invoice_line_ids"].append((0, 0, line_rec))
-
-            order_id = self._post_odoo(stream_name, record_processed)
+            if isinstance(record["attachments"], str):
+                record["attachments"] = json.loads(record["attachments"])
 
-            if order_id:
-                # Handle attachments
-                if record.get("attachments"):
-                    # If line item is string, convert to dict
-                    if isinstance(record["attachments"], str):
-                        record["attachments"] = json.loads(record["attachments"])
-
-                    for attachment in record["attachments"]:
-                        self.upload_attachment(
-                            order_id, attachment.get("id"), attachment.get("name")
-                        )
-
-            if mark_posted:
-                updated = self._update_odoo(
+            uploads = self.upload_attachments(
+                order_id, record["attachments"], check_existing
+            )
+
+        posted = self.post_moves([order_id]) if mark_posted else []
+
+        # Uploads rejected by Odoo return None, they are retried on resume.
+        uploaded = [upload.result() for upload in uploads]
+        if all(uploaded):
+            self.checkpoint(record, order_id, "attachments")
+        else:
+            self.logger.warning(
+                f"{uploaded.count(None)} attachments of {self.name} {order_id} "
+                "were not uploaded."
+            )
+        if posted:
+            self.checkpoint(record, order_id, "posted")
+
+    @timed("post")
+    def post_moves(self, move_ids):
+        """Post moves with one `action_post`, keeping them marked as not paid.
+
+        Residuals of every posted move are read back with a single `read` and
+        moves Odoo considers paid get one shared `write`. Returns the ids that
+        were posted.
+        """
+        stream_name = "account.move"
+        if not move_ids:
+            return []
+        context = {"lang": "en_US"}
+        self.logger.info(f" Posting {self.name}: {stream_name} - {move_ids}")
+        try:
+            self.execute_kw(
+                stream_name, "action_post", [move_ids], {"context": context}
+            )
+            posted = list(move_ids)
+        except xmlrpc.client.Fault as error:
+            self.logger.warning(error.faultString)
+            if len(move_ids) == 1:
+                return []
+            # Find the moves that can't be posted by posting one at a time.
+            return [move_id for move_id in move_ids if self.post_moves([move_id])]
+
+        # We need to verify that bill/invoice is not marked as paid.
+        residuals = self.execute_kw(
+            stream_name, "read", [posted], {"fields": ["amount_residual"]}
+        )
+        # Only a real amount says a move is paid, a dry run reads back False.
+        paid = [
+            move["id"]
+            for move in residuals
+            if isinstance(move.get("amount_residual"), (int, float))
+            and not isinstance(move["amount_residual"], bool)
+            and move["amount_residual"] <= 0
+        ]
+        if paid:
+            # Manually override the Paid status.
+            try:
+                self.execute_kw(
                     stream_name,
-                    record={"state": "posted"},
-                    update_id=order_id,
-                    action="action_post",
+                    "write",
+                    [paid, {"payment_state": "not_paid"}],
+                    {"context": context},
                 )
-                if updated:
-                    # We need to verify that bill/invoice is not marked as paid.
-                    invoice_due_amount = self.read_odoo(
-                        "account.move", order_id, ["amount_residual"]
-                    )
-                    if len(invoice_due_amount) > 0:
-                        invoice_due_amount = invoice_due_amount[0]
-                        if "amount_residual" in invoice_due_amount:
-                            if invoice_due_amount["amount_residual"] <= 0:
-                                # Manually override the Paid status.
-                                updated_amount = self._update_odoo(
-                                    stream_name,
-                                    record={"payment_state": "not_paid"},
-                                    update_id=order_id,
-                                )
-                    print(f"Invoice {order_id} marked as Posted")
+            except xmlrpc.client.Fault as error:
+                self.logger.warning(error.faultString)
+        for move_id in posted:
+            self.logger.info(f"Invoice {move_id} marked as Posted")
+        return posted
+
+    def process_invoice(
+        self, record, inv_type="out_invoice", contact_key="customerName"
+    ):
+        prepared = self.prepare_invoice(record, inv_type, contact_key)
+        if prepared is None:
+            return
+        record_processed, context_dictionary, mark_posted = prepared
+        order_id = self._post_odoo(
+            "account.move", record_processed, context_dictionary
+        )
+        if order_id:
+            # Lines are created along with the move.
+            self.checkpoint(record, order_id, "lines")
+            self.finalize_invoice(order_id, record, mark_posted)
         return order_id
 
-    def upsert_record(self, record: dict, context: dict):
+    def process_invoice_chunked(
+        self, record, inv_type="out_invoice", contact_key="customerName"
+    ):
+        """Create a move a chunk of lines at a time, see `line_chunk_size`.
+
+        The move is created with the first chunk and checkpointed as
+        "created", each further chunk is appended with one `write`. Returns
+        the move id and the list of failed lines.
+        """
+        prepared = self.prepare_invoice(record, inv_type, contact_key, lines=False)
+        if prepared is None:
+            return None, []
+        record_processed, _, mark_posted = prepared
+        del record_processed["invoice_line_ids"]
+        order_id, failed_lines = self.create_with_line_chunks(
+            "account.move",
+            record_processed,
+            "invoice_line_ids",
+            self.invoice_line_chunks(
+                record["lineItems"], record_processed["currency_id"]
+            ),
+            "account.move.line",
+            "move_id",
+            on_created=lambda move_id: self.checkpoint(record, move_id, "created"),
+        )
+        if order_id:
+            self.checkpoint(record, order_id, "lines")
+            self.finalize_invoice(order_id, record, mark_posted)
+        return order_id, failed_lines
+
+    def resume_lines(self, record, move_id):
+        """Append the lines a chunked create didn't get to before it died.
+
+        Lines already on the move are skipped by count, chunks are written
+        whole so they match the first mapped lines.
+        """
+        move = self.read_odoo("account.move", move_id, ["invoice_line_ids"])
+        done = len(move[0].get("invoice_line_ids") or []) if move else 0
+        currency = self.find_currency(record["currency"])
+        if currency is None:
+            raise Exception(f"Currency {record['currency']} not found")
+        failed_lines = []
+        for lines, context in self.invoice_line_chunks(
+            record.get("lineItems"), currency["id"], skip=done
+        ):
+            failed_lines += self.append_lines(
+                "account.move",
+                move_id,
+                "invoice_line_ids",
+                lines,
+                "account.move.line",
+                "move_id",
+                context,
+            )
+        if failed_lines:
+            self.logger.warning(f"{self.name} {move_id}: failed lines {failed_lines}")
+        self.checkpoint(record, move_id, "lines")
+
+    def checkpoint_key(self, record):
+        """Key of a source record in the checkpoint journal."""
+        if record.get("invoiceNumber"):
+            return f"{self.name}|{record.get(self.contact_key)}|{record['invoiceNumber']}"
+        content = json.dumps(record, sort_keys=True, default=str)
+        return f"{self.name}|{hashlib.sha256(content.encode()).hexdigest()}"
+
+    def checkpoint(self, record, move_id, stage):
+        # Later stages are only tracked for moves the journal saw created.
+        if self.journal is None:
+            return
+        key = self.checkpoint_key(record)
+        if stage == "posted" and not self.journal.reached(key, "attachments"):
+            # Posting must not skip attachments that still need uploading.
+            return
+        if stage in ("created", "lines") or self.journal.get(key):
+            self.journal.mark(key, move_id, stage)
+
+    @timed("lookup")
+    def resume_checkpoints(self, records, results):
+        """Resume records an earlier run created, filling in their results.
+
+        Moves that went through every stage are skipped, unless
+        `upsert_by_ref` asks for them to be updated. The others resume at
+        the stage they reached. Moves deleted since are created again.
+        """
+        upsert_by_ref = self.config.get("upsert_by_ref", False)
+        entries = {}
+        for index, record in enumerate(records):
+            if record.get("id"):
+                continue
+            entry = self.journal.get(self.checkpoint_key(record))
+            if entry:
+                entries[index] = entry
+        if not entries:
+            return
+        moves = self.execute_kw(
+            "account.move",
+            "search_read",
+            [[["id", "in", sorted({entry["id"] for entry in entries.values()})]]],
+            {"fields": ["id", "state"]},
+        )
+        states = {move["id"]: move["state"] for move in moves}
+
+        resumable = []
+        for index, entry in entries.items():
+            if entry["id"] not in states:
+                continue
+            record = records[index]
+            mark_posted = str(record.get("status", "")).lower() == "posted"
+            done = entry["stage"] == "posted" or (
+                entry["stage"] == "attachments" and not mark_posted
+            )
+            if not done:
+                resumable.append(index)
+            elif not upsert_by_ref:
+                self.logger.info(
+                    f"Invoice {entry['id']} already created by an earlier run. Skipping..."
+                )
+                results[index] = (entry["id"], True, {"existing": True})
+
+        def resume(index):
+            move_id = entries[index]["id"]
+            try:
+                return self.resume_invoice(
+                    records[index], entries[index], states[move_id]
+                )
+            except Exception as e:
+                self.logger.exception(f"Upsert record error {str(e)}")
+                return move_id, False, {"error": str(e)}
+
+        for index, result in zip(resumable, self.map_records(resume, resumable)):
+            results[index] = result
+
+    def resume_invoice(self, record, entry, state):
+        move_id = entry["id"]
+        self.logger.info(f"Resuming invoice {move_id} after stage {entry['stage']}")
+        mark_posted = str(record.get("status", "")).lower() == "posted"
+        if not self.journal.reached(self.checkpoint_key(record), "lines"):
+            self.resume_lines(record, move_id)
+        if not self.journal.reached(self.checkpoint_key(record), "attachments"):
+            # Attachments uploaded before the interruption are not sent again.
+            self.finalize_invoice(
+                move_id, record, mark_posted and state != "posted", check_existing=True
+            )
+        elif mark_posted and state != "posted":
+            if self.post_moves([move_id]):
+                self.checkpoint(record, move_id, "posted")
+        if state == "posted":
+            self.checkpoint(record, move_id, "posted")
+        return self.invoice_result(record, move_id)
+
+    def update_invoice(self, record, move, lines):
+        """Update a draft move with the fields and lines that changed.
+
+        Sends a single `write`, with one2many commands for the changed lines
+        only, and nothing at all when the move is already up to date.
+        """
+        prepared = self.prepare_invoice(record, self.inv_type, self.contact_key)
+        if prepared is None:
+            return self.invoice_result(record, None)
+        record_processed, context_dictionary, mark_posted = prepared
+        move_id = move["id"]
+        if move["state"] != "draft":
+            self.logger.warning(
+                f"Invoice {move_id} is {move['state']}, only drafts are updated. Skipping..."
+            )
+            return move_id, True, {"existing": True}
+
+        changes = changed_fields(move, record_processed, MOVE_UPDATE_FIELDS)
+        commands = line_commands(
+            lines,
+            [vals for _, _, vals in record_processed["invoice_line_ids"]],
+            MOVE_LINE_UPDATE_FIELDS,
+        )
+        if commands:
+            changes["invoice_line_ids"] = commands
+        if changes:
+            self.log_payload("Updating", "account.move", [[move_id], changes])
+            with get_metrics().timer(self.name, "update"):
+                self.execute_kw(
+                    "account.move",
+                    "write",
+                    [[move_id], changes],
+                    {"context": context_dictionary or {"lang": "en_US"}},
+                )
+        self.finalize_invoice(move_id, record, mark_posted, check_existing=True)
+        if not changes and not mark_posted:
+            return move_id, True, {"existing": True}
+        return self.invoice_result(record, move_id, updated=True)
+
+    def invoice_result(self, record, id, updated=False):
         status = True
         state_updates = dict()
-
-        id = self.process_invoice(record)
         if id:
-            if record.get("id"):
+            if updated:
                 state_updates["is_updated"] = True
             else:
                 state_updates["success"] = True
@@ -699,24 +1690,244 @@ class Invoices(OdooV3Sink):
             status = False
         return id, status, state_updates
 
-
-class Bills(Invoices):
-    endpoint = "Bills"
-    name = "Bills"
-
     def upsert_record(self, record: dict, context: dict):
-        status = True
-        state_updates = dict()
+        return self.process_batch_records([{"record": record, "context": context}])[0]
 
-        id = self.process_invoice(
-            record, inv_type="in_invoice", contact_key="vendorName"
+    def create_invoice(self, record):
+        """Create the move of a record on its own, returns its result."""
+        if self.line_chunk_size:
+            id, failed_lines = self.process_invoice_chunked(
+                record, self.inv_type, self.contact_key
+            )
+            id, status, state_updates = self.invoice_result(record, id)
+            if failed_lines:
+                self.logger.warning(f"{self.name} {id}: failed lines {failed_lines}")
+                state_updates["failed_lines"] = failed_lines
+            return id, status, state_updates
+        id = self.process_invoice(record, self.inv_type, self.contact_key)
+        return self.invoice_result(record, id)
+
+    @timed("lookup")
+    def find_existing_moves(self, refs):
+        """Fetch moves of this sink's type matching any of `refs`, by ref.
+
+        One `search_read` for the whole batch, reading only the fields needed
+        to match a record.
+        """
+        refs = list({ref for ref in refs if ref})
+        if not refs:
+            return {}
+        moves = self.execute_kw(
+            "account.move",
+            "search_read",
+            [[["ref", "in", refs], ["move_type", "=", self.inv_type]]],
+            {"fields": ["id", "ref", "move_type", "partner_id"]},
         )
-        if id:
+        existing = {}
+        for move in moves:
+            existing.setdefault(move["ref"], []).append(move)
+        return existing
+
+    def match_existing_move(self, existing, record):
+        for move in existing.get(record.get("invoiceNumber"), []):
+            partner = self.find_parnter(record.get(self.contact_key))
+            if not partner or not move["partner_id"]:
+                return move
+            if move["partner_id"][0] == partner[0]["id"]:
+                return move
+
+    def match_batch(self, records, results):
+        """Settle resumed and duplicate records, return the moves to update.
+
+        Returns `{index: move_id}` for records carrying the id of a move of
+        this sink's type, and for records matching an existing move by ref
+        with `upsert_by_ref`. Other ids are matched by ref or created.
+        """
+        if self.journal is not None:
+            self.resume_checkpoints(records, results)
+        self.prefetch_batch(
+            [record for record, result in zip(records, results) if result is None],
+            self.contact_key,
+        )
+
+        targets = {}
+        for index, record in enumerate(records):
+            if results[index] is not None:
+                continue
             if record.get("id"):
-                state_updates["is_updated"] = True
+                try:
+                    targets[index] = int(record["id"])
+                except (TypeError, ValueError):
+                    self.logger.warning(f"Invalid invoice id {record['id']}")
+        if targets:
+            found = self.execute_kw(
+                "account.move",
+                "search_read",
+                [
+                    [
+                        ["id", "in", sorted(set(targets.values()))],
+                        ["move_type", "=", self.inv_type],
+                    ]
+                ],
+                {"fields": ["id"]},
+            )
+            found = {move["id"] for move in found}
+            for index, move_id in list(targets.items()):
+                if move_id not in found:
+                    # Never write to a move of another type, e.g. a customer
+                    # invoice sharing the id of a bill.
+                    self.logger.warning(
+                        f"Invoice {move_id} is not a {self.inv_type} move. Ignoring its id..."
+                    )
+                    del targets[index]
+
+        upsert_by_ref = self.config.get("upsert_by_ref", False)
+        if upsert_by_ref or self.config.get("verify_ref", False):
+            existing = self.find_existing_moves(
+                [
+                    record.get("invoiceNumber")
+                    for index, record in enumerate(records)
+                    if index not in targets and results[index] is None
+                ]
+            )
+            for index, record in enumerate(records):
+                if index in targets or results[index] is not None:
+                    continue
+                move = self.match_existing_move(existing, record)
+                if not move:
+                    continue
+                if upsert_by_ref:
+                    targets[index] = move["id"]
+                else:
+                    self.logger.warning(
+                        f"Invoice with ref: {move['ref']} found. Skipping..."
+                    )
+                    results[index] = (move["id"], True, {"existing": True})
+        return targets
+
+    def process_batch_records(self, items):
+        records = [item["record"] for item in items]
+        results = [None] * len(items)
+        # A failing batch lookup or create falls back to one record at a time.
+        try:
+            targets = self.match_batch(records, results)
+        except Exception as e:
+            return self.upsert_each(items, results, e)
+
+        # Updates of the same move are diffed against fresh values, in rounds.
+        # Ids not found in Odoo fall back to creating the move.
+        remaining = list(targets)
+        while remaining:
+            updates, later, seen = [], [], set()
+            for index in remaining:
+                (later if targets[index] in seen else updates).append(index)
+                seen.add(targets[index])
+            try:
+                moves = self.read_moves(sorted(seen))
+            except Exception as e:
+                return self.upsert_each(items, results, e)
+            updates = [index for index in updates if targets[index] in moves]
+
+            def update(index):
+                try:
+                    return self.update_invoice(records[index], *moves[targets[index]])
+                except Exception as e:
+                    self.logger.exception(f"Upsert record error {str(e)}")
+                    return targets[index], False, {"error": str(e)}
+
+            for index, result in zip(updates, self.map_records(update, updates)):
+                results[index] = result
+            remaining = later
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        # Chunked moves are created one by one to keep memory bounded.
+        if not self.bulk_create or self.line_chunk_size:
+
+            def create(index):
+                try:
+                    return self.create_invoice(records[index])
+                except Exception as e:
+                    self.logger.exception(f"Upsert record error {str(e)}")
+                    return None, False, {"error": str(e)}
+
+            for index, result in zip(pending, self.map_records(create, pending)):
+                results[index] = result
+            return results
+
+        prepared = {}
+        for index in pending:
+            record = records[index]
+            try:
+                invoice = self.prepare_invoice(record, self.inv_type, self.contact_key)
+            except Exception as e:
+                self.logger.exception(f"Upsert record error {str(e)}")
+                results[index] = (None, False, {"error": str(e)})
+                continue
+            if invoice is None:
+                results[index] = self.invoice_result(record, None)
             else:
-                state_updates["success"] = True
-        else:
-            state_updates["success"] = False
-            status = False
-        return id, status, state_updates
+                prepared[index] = invoice
+
+        # Moves needing a different create context can't share a call.
+        groups = {}
+        for index, (payload, context, _) in prepared.items():
+            key = json.dumps(context, sort_keys=True)
+            groups.setdefault(key, (context, []))[1].append(index)
+        ids = {}
+        for context, indexes in groups.values():
+            payloads = [prepared[index][0] for index in indexes]
+            try:
+                created = self._post_odoo_many("account.move", payloads, context)
+            except Exception as e:
+                for index in indexes:
+                    results[index] = (None, False, {"error": unknown_outcome(e)})
+                continue
+            ids.update(zip(indexes, created))
+        for index, order_id in ids.items():
+            if order_id:
+                self.checkpoint(records[index], order_id, "lines")
+
+        def finalize(index):
+            order_id = ids.get(index)
+            try:
+                if order_id:
+                    self.finalize_invoice(order_id, records[index], False)
+            except Exception as e:
+                self.logger.exception(f"Upsert record error {str(e)}")
+                return order_id, False, {"error": str(e)}
+            return self.invoice_result(records[index], order_id)
+
+        # Attachments upload per move, on the worker pool if enabled.
+        indexes = [index for index in prepared if results[index] is None]
+        for index, result in zip(indexes, self.map_records(finalize, indexes)):
+            results[index] = result
+
+        # Moves of the whole batch are posted together.
+        to_post = {
+            ids[index]: index
+            for index, (_, _, mark_posted) in prepared.items()
+            if mark_posted and ids.get(index) and results[index][1]
+        }
+        try:
+            posted = self.post_moves(list(to_post))
+        except Exception as e:
+            self.logger.warning(
+                f"Posting {len(to_post)} moves failed: {e}. Posting them one by one."
+            )
+            posted = []
+            for move_id, index in to_post.items():
+                try:
+                    posted += self.post_moves([move_id])
+                except Exception as e:
+                    self.logger.exception(f"Upsert record error {str(e)}")
+                    results[index] = (move_id, False, {"error": str(e)})
+        for move_id in posted:
+            self.checkpoint(records[to_post[move_id]], move_id, "posted")
+        return results
+
+
+class Bills(Invoices):
+    endpoint = "Bills"
+    name = "Bills"
+    inv_type = "in_invoice"
+    contact_key = "vendorName"
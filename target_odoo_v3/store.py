@@ -0,0 +1,171 @@
+"""Persistent on-disk cache of Odoo reference data, shared between runs."""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_TTL = 24 * 60 * 60
+# Rows written this long before a sync are fetched again on the next one, so
+# clock skew between this host and Odoo can't hide a change.
+CLOCK_SKEW = timedelta(hours=1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    scope TEXT, model TEXT, id INTEGER, data TEXT,
+    PRIMARY KEY (scope, model, id)
+);
+CREATE TABLE IF NOT EXISTS lookups (
+    scope TEXT, model TEXT, field TEXT, value TEXT,
+    PRIMARY KEY (scope, model, field, value)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    scope TEXT, model TEXT, synced_at REAL, write_date TEXT,
+    PRIMARY KEY (scope, model)
+);
+"""
+
+
+class ReferenceStore:
+    """SQLite cache of reference models, keyed by Odoo url and database.
+
+    A model is fully refetched once its TTL has expired. Within the TTL only
+    rows whose `write_date` moved since the last sync are fetched, so a warm
+    run starts with a single small query per model. Archived or deleted rows
+    are only dropped on the next full refetch. Models cached per lookup key,
+    such as products, are never fetched whole: `refresh_rows` brings only the
+    rows a batch needs up to date.
+    """
+
+    def __init__(self, path, url, db, ttl=DEFAULT_TTL, ttls=None):
+        self.scope = f"{url}|{db}"
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _anchor():
+        return (datetime.utcnow() - CLOCK_SKEW).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _sync(self, model):
+        row = self._conn.execute(
+            "SELECT synced_at, write_date FROM syncs WHERE scope = ? AND model = ?",
+            (self.scope, model),
+        ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[0] > self.ttls.get(model, self.ttl):
+            return None
+        return row
+
+    def _clear(self, model):
+        for table in ("records", "lookups", "syncs"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE scope = ? AND model = ?",
+                (self.scope, model),
+            )
+
+    def _save_records(self, model, records, synced_at, write_date):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+            [(self.scope, model, r["id"], json.dumps(r)) for r in records],
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?)",
+            (self.scope, model, synced_at, write_date),
+        )
+
+    def _records(self, model):
+        rows = self._conn.execute(
+            "SELECT data FROM records WHERE scope = ? AND model = ?",
+            (self.scope, model),
+        )
+        return [json.loads(data) for data, in rows]
+
+    def records(self, model):
+        """Return the cached rows of `model` as they are, without syncing."""
+        with self._lock:
+            return self._records(model)
+
+    def refresh(self, model, search):
+        """Bring the cached rows of `model` up to date and return them.
+
+        `search(domain)` runs a `search_read` that includes `write_date`.
+        """
+        with self._lock:
+            anchor = self._anchor()
+            sync = self._sync(model)
+            if sync is None:
+                self._clear(model)
+                records = search([])
+                synced_at = time.time()
+            else:
+                synced_at, write_date = sync
+                records = search([["write_date", ">=", write_date]])
+            self._save_records(model, records, synced_at, anchor)
+            self._conn.commit()
+            return self._records(model)
+
+    def expire(self, model):
+        """Clear `model` if its TTL has expired, starting a new sync period."""
+        with self._lock:
+            if self._sync(model) is None:
+                self._clear(model)
+                self._save_records(model, [], time.time(), self._anchor())
+                self._conn.commit()
+
+    def refresh_rows(self, model, search, domain):
+        """Refetch the rows of `model` matching `domain` changed since its sync.
+
+        Returns the changed rows. The model's sync point is left where it is,
+        so rows outside `domain` are still caught by later refreshes.
+        """
+        with self._lock:
+            sync = self._sync(model)
+            if sync is None:
+                return []
+            records = search([["write_date", ">=", sync[1]]] + domain)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                [(self.scope, model, r["id"], json.dumps(r)) for r in records],
+            )
+            self._conn.commit()
+            return records
+
+    def lookups(self, model):
+        """Return the `(field, value)` keys already resolved for `model`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field, value FROM lookups WHERE scope = ? AND model = ?",
+                (self.scope, model),
+            )
+            return [(field, json.loads(value)) for field, value in rows]
+
+    def save_lookups(self, model, field, values, records):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)",
+                [(self.scope, model, field, json.dumps(v)) for v in values],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                [(self.scope, model, r["id"], json.dumps(r)) for r in records],
+            )
+            self._conn.commit()
+
+
+def get_store(config):
+    """Return the persistent store configured by `cache_path`, if any."""
+    path = config.get("cache_path")
+    if not path:
+        return None
+    return ReferenceStore(
+        path,
+        config.get("url"),
+        config.get("db"),
+        config.get("cache_ttl") or DEFAULT_TTL,
+        config.get("cache_ttls"),
+    )
@@ -4,7 +4,10 @@ from singer_sdk import typing as th
 from target_hotglue.target import TargetHotglue
 
 
+from target_odoo_v3.dryrun import DryRunClient
+from target_odoo_v3.metrics import get_metrics
 from target_odoo_v3.sinks import (
+    OdooV3Sink,
     TaxRates,
     Vendors,
     Suppliers,
@@ -29,8 +32,47 @@ class TargetOdooV3(TargetHotglue):
         th.Property("url", th.StringType, required=True),
         th.Property("username", th.StringType, required=True),
         th.Property("password", th.StringType, required=True),
+        th.Property("transport", th.StringType),
+        th.Property("connection_pool_size", th.IntegerType),
+        th.Property("batch_size", th.IntegerType),
+        th.Property("batch_max_latency", th.NumberType),
+        th.Property("max_workers", th.IntegerType),
+        th.Property("line_chunk_size", th.IntegerType),
+        th.Property("attachment_workers", th.IntegerType),
+        th.Property("attachment_max_inflight_bytes", th.IntegerType),
+        th.Property("cache_path", th.StringType),
+        th.Property("cache_ttl", th.NumberType),
+        th.Property("cache_ttls", th.ObjectType()),
+        th.Property("upsert_by_ref", th.BooleanType),
+        th.Property("update_vendors", th.BooleanType),
+        th.Property("checkpoint_path", th.StringType),
+        th.Property("max_retries", th.IntegerType),
+        th.Property("retry_backoff", th.NumberType),
+        th.Property("retry_max_backoff", th.NumberType),
+        th.Property("request_timeout", th.NumberType),
+        th.Property("metrics_path", th.StringType),
+        th.Property("log_payloads", th.StringType),
+        th.Property("dry_run", th.BooleanType),
+        th.Property("dry_run_plan", th.StringType),
+        th.Property("dry_run_fixtures", th.StringType),
     ).to_dict()
 
+    def _process_endofpipe(self) -> None:
+        # Flush buffered records first so their states make the final message.
+        indexes = {}
+        sessions = set()
+        for sink in self._sinks_active.values():
+            if isinstance(sink, OdooV3Sink):
+                sink.flush()
+                indexes.update(sink.session.indexes)
+                sessions.add(sink.session)
+        super()._process_endofpipe()
+        get_metrics().emit(self.logger, self.config.get("metrics_path"), indexes)
+        for session in sessions:
+            if isinstance(session.client, DryRunClient):
+                session.client.report(self.logger)
+                session.client.close()
+
 
 if __name__ == "__main__":
     TargetOdooV3.cli()
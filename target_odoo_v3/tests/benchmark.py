@@ -0,0 +1,199 @@
+"""Offline throughput benchmark of the target against `FakeOdoo`.
+
+Replays synthetic vendors, purchase orders and bills with attachments
+through `TargetOdooV3` and reports records per second, RPC calls per record
+and peak memory. Settings under test are passed as target config::
+
+    python -m target_odoo_v3.tests.benchmark --bills 500 --lines 20 \\
+        --latency 0.01 --config '{"batch_size": 100, "max_workers": 4}'
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from target_odoo_v3.target import TargetOdooV3
+from target_odoo_v3.tests.fake_odoo import FakeOdoo, seed_reference_data
+
+
+def vendor_records(count):
+    for i in range(count):
+        yield {
+            "vendorName": f"Vendor {i}",
+            "emailAddress": f"vendor{i}@example.com",
+            "phoneNumbers": {"number": f"555-{i:04d}"},
+            "addresses": {"line1": f"{i} Main St", "city": "Springfield", "country": "US"},
+        }
+
+
+def order_records(count, lines, vendors):
+    for i in range(count):
+        yield {
+            "id": f"PO{i:06d}",
+            "supplier_name": f"Vendor {i % max(vendors, 1)}",
+            "transaction_date": "2024-01-15",
+            "line_items": [
+                {"product_remoteId": 100 + j % 50, "quantity": j + 1, "sub_total_price": 10.0 * (j + 1)}
+                for j in range(lines)
+            ],
+        }
+
+
+def bill_records(count, lines, vendors, attachments):
+    for i in range(count):
+        yield {
+            "invoiceNumber": f"BILL{i:06d}",
+            "vendorName": f"Vendor {i % max(vendors, 1)}",
+            "status": "posted" if i % 2 else "draft",
+            "createdAt": "2024-01-15",
+            "dueDate": "2024-02-15",
+            "currency": "USD",
+            "lineItems": [
+                {
+                    "productName": f"Product {j % 50}",
+                    "accountNumber": "600000",
+                    "quantity": j + 1,
+                    "unitPrice": 10.0,
+                    "totalPrice": 10.0 * (j + 1),
+                }
+                for j in range(lines)
+            ],
+            "attachments": [
+                {"id": f"{i}-{k}", "name": "scan.pdf"} for k in range(attachments)
+            ],
+        }
+
+
+def singer_messages(streams):
+    """Yield SCHEMA then RECORD messages for `{stream: records}`."""
+    for stream, records in streams.items():
+        if not records:
+            continue
+        properties = {}
+        for record in records:
+            properties.update({key: {} for key in record})
+        yield {
+            "type": "SCHEMA",
+            "stream": stream,
+            "schema": {"type": "object", "properties": properties},
+            "key_properties": [],
+        }
+        for record in records:
+            yield {"type": "RECORD", "stream": stream, "record": record}
+
+
+def write_attachments(input_path, bills, attachment_size):
+    content = os.urandom(attachment_size)
+    for bill in bills:
+        for attachment in bill["attachments"]:
+            name = f"{attachment['id']}_{attachment['name']}"
+            with open(os.path.join(input_path, name), "wb") as f:
+                f.write(content)
+
+
+def run(
+    vendors=100,
+    orders=100,
+    bills=100,
+    lines=10,
+    attachments=1,
+    attachment_size=64 * 1024,
+    latency=0.0,
+    config=None,
+    trace_memory=False,
+):
+    """Run one benchmark and return its report as a dict."""
+    streams = {
+        "Vendors": list(vendor_records(vendors)),
+        "BuyOrders": list(order_records(orders, lines, vendors)),
+        "Bills": list(bill_records(bills, lines, vendors, attachments)),
+    }
+    records = sum(len(r) for r in streams.values())
+    lines_input = "\n".join(json.dumps(m) for m in singer_messages(streams)) + "\n"
+
+    with FakeOdoo(latency=latency) as odoo, tempfile.TemporaryDirectory() as input_path:
+        seed_reference_data(odoo)
+        write_attachments(input_path, streams["Bills"], attachment_size)
+        target_config = {
+            "url": odoo.url,
+            "db": "benchmark",
+            "username": "admin",
+            "password": "admin",
+            "input_path": input_path,
+        }
+        target_config.update(config or {})
+        target = TargetOdooV3(config=target_config)
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            target.listen(io.StringIO(lines_input))
+        elapsed = time.perf_counter() - start
+        traced_peak = None
+        if trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        calls = sum(count for key, count in odoo.calls.items())
+        return {
+            "records": records,
+            "seconds": round(elapsed, 3),
+            "records_per_second": round(records / elapsed, 2) if elapsed else None,
+            "rpc_calls": calls,
+            "rpc_calls_per_record": round(calls / records, 3) if records else None,
+            # ru_maxrss is in KiB on Linux.
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "traced_peak_bytes": traced_peak,
+            "calls": {
+                f"{model}.{method}": count
+                for (model, method), count in sorted(odoo.calls.items())
+            },
+            "created": {model: len(rows) for model, rows in sorted(odoo.tables.items())},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vendors", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--bills", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=10, help="lines per order/bill")
+    parser.add_argument("--attachments", type=int, default=1, help="files per bill")
+    parser.add_argument("--attachment-size", type=int, default=64 * 1024)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every call"
+    )
+    parser.add_argument("--config", default="{}", help="extra target config, as JSON")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also report the tracemalloc peak, slows the run down",
+    )
+    args = parser.parse_args()
+
+    # Per-record logs would dominate the measurement.
+    logging.disable(logging.INFO)
+    report = run(
+        vendors=args.vendors,
+        orders=args.orders,
+        bills=args.bills,
+        lines=args.lines,
+        attachments=args.attachments,
+        attachment_size=args.attachment_size,
+        latency=args.latency,
+        config=json.loads(args.config),
+        trace_memory=args.trace_memory,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
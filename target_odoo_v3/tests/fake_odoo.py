@@ -0,0 +1,286 @@
+"""Local stand-in for an Odoo server, for tests and benchmarks.
+
+Serves `common.authenticate` and `object.execute_kw` over XML-RPC, and the
+same calls on `/jsonrpc`, from in-memory tables. Every call can be delayed
+by `latency` seconds to emulate a remote tenant.
+"""
+
+import collections
+import itertools
+import json
+import threading
+import time
+import xmlrpc.client
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+UID = 2
+
+# Many2one fields and the model they point to, read as `[id, display_name]`.
+MANY2ONE = {
+    "account_id": "account.account",
+    "company_id": "res.partner",
+    "country_id": "res.country",
+    "currency_id": "res.currency",
+    "move_id": "account.move",
+    "order_id": "purchase.order",
+    "partner_id": "res.partner",
+    "product_id": "product.product",
+    "tax_group_id": "account.tax.group",
+}
+# One2many fields, stored as rows of the line model pointing to their parent.
+ONE2MANY = {
+    ("account.move", "invoice_line_ids"): ("account.move.line", "move_id"),
+    ("purchase.order", "order_line"): ("purchase.order.line", "order_id"),
+}
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    # Keep-alive, like Odoo behind a proxy.
+    protocol_version = "HTTP/1.1"
+    rpc_paths = ("/xmlrpc/2/common", "/xmlrpc/2/object")
+
+    def do_POST(self):
+        if self.path != "/jsonrpc":
+            return super().do_POST()
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        params = request["params"]
+        try:
+            if params["method"] == "authenticate":
+                response = {"result": self.server.odoo.authenticate(*params["args"])}
+            else:
+                response = {"result": self.server.odoo.execute_kw(*params["args"])}
+        except xmlrpc.client.Fault as fault:
+            response = {
+                "error": {
+                    "code": 200,
+                    "message": "Odoo Server Error",
+                    "data": {"name": "odoo.exceptions.UserError", "message": fault.faultString},
+                }
+            }
+        body = json.dumps(dict(response, jsonrpc="2.0", id=request["id"])).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+def matches(record, domain):
+    for condition in domain:
+        if not isinstance(condition, (list, tuple)):
+            # "&" / "|" operators, conditions are always and-ed here.
+            continue
+        field, operator, value = condition
+        current = record.get(field)
+        if isinstance(current, list) and len(current) == 2:
+            # Many2one values are stored as [id, name].
+            current = current[0]
+        if operator == "=" and current != value:
+            return False
+        if operator == "!=" and current == value:
+            return False
+        if operator == "in" and current not in value:
+            return False
+        if operator == ">=" and not (current is not None and current >= value):
+            return False
+    return True
+
+
+class FakeOdoo:
+    """In-memory Odoo models served on a local port.
+
+    `tables` maps model names to lists of records and can be seeded before
+    or during a run. `calls` counts the calls per `(model, method)`.
+    Relational fields behave like Odoo's: many2one values are read as
+    `[id, display_name]` and one2many commands create, update and delete
+    rows of the line model.
+    """
+
+    def __init__(self, latency=0.0, port=0):
+        self.latency = latency
+        self.tables = collections.defaultdict(list)
+        self.calls = collections.Counter()
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self.server = Server(
+            ("127.0.0.1", port),
+            requestHandler=RequestHandler,
+            logRequests=False,
+            allow_none=True,
+        )
+        self.server.odoo = self
+        self.server.register_function(self.authenticate, "authenticate")
+        self.server.register_function(self.execute_kw, "execute_kw")
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def seed(self, model, records):
+        """Add records to `model`, relational values are stored as on create."""
+        for values in records:
+            record = {"id": values.get("id") or next(self._ids)}
+            self.tables[model].append(record)
+            self._store(model, record, {k: v for k, v in values.items() if k != "id"})
+
+    def authenticate(self, db, username, password, context):
+        self.calls[("common", "authenticate")] += 1
+        time.sleep(self.latency)
+        return UID
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        self.calls[(model, method)] += 1
+        time.sleep(self.latency)
+        kwargs = kwargs or {}
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            raise xmlrpc.client.Fault(1, f"Unknown method {model}.{method}")
+        with self._lock:
+            return handler(model, args, kwargs)
+
+    def _display_name(self, model, id):
+        for record in self.tables[model]:
+            if record["id"] == id:
+                return record.get("name") or record.get("ref") or str(id)
+        return str(id)
+
+    def _value(self, model, record, field):
+        """A field of a stored record, shaped the way Odoo returns it."""
+        if (model, field) in ONE2MANY:
+            line_model, parent_field = ONE2MANY[(model, field)]
+            return [
+                line["id"]
+                for line in self.tables[line_model]
+                if line.get(parent_field) == record["id"]
+            ]
+        if model == "account.move" and field == "attachment_ids":
+            return [
+                attachment["id"]
+                for attachment in self.tables["ir.attachment"]
+                if attachment.get("res_model") == model
+                and attachment.get("res_id") == record["id"]
+            ]
+        value = record.get(field, False)
+        if field in MANY2ONE and isinstance(value, int) and value:
+            return [value, self._display_name(MANY2ONE[field], value)]
+        if value is None:
+            return False
+        return value
+
+    def _export(self, model, records, fields):
+        fields = set(fields) | {"id"} if fields else None
+        return [
+            {f: self._value(model, r, f) for f in fields or set(r) | {"id"}}
+            for r in records
+        ]
+
+    def _search_read(self, model, args, kwargs):
+        domain = args[0] if args else kwargs.get("domain", [])
+        records = [r for r in self.tables[model] if matches(r, domain)]
+        if kwargs.get("limit"):
+            records = records[: kwargs["limit"]]
+        return self._export(model, records, kwargs.get("fields"))
+
+    def _read(self, model, args, kwargs):
+        ids = set(args[0])
+        fields = kwargs.get("fields") or (args[1] if len(args) > 1 else None)
+        records = [r for r in self.tables[model] if r["id"] in ids]
+        return self._export(model, records, fields)
+
+    def _store(self, model, record, values):
+        """Write `values` on a stored record, applying relational commands."""
+        for field, value in values.items():
+            if (model, field) in ONE2MANY:
+                self._apply_lines(model, record["id"], field, value)
+            elif field in MANY2ONE and isinstance(value, (list, tuple)):
+                # Seeded as Odoo returns it, `[id, display_name]`.
+                record[field] = value[0] if value else False
+            elif isinstance(value, (list, tuple)) and value and all(
+                isinstance(command, (list, tuple)) for command in value
+            ):
+                # Many2many commands, only "replace" is used by the target.
+                for command in value:
+                    if command[0] == 6:
+                        record[field] = list(command[2])
+            else:
+                record[field] = value
+
+    def _apply_lines(self, model, parent_id, field, commands):
+        line_model, parent_field = ONE2MANY[(model, field)]
+        lines = self.tables[line_model]
+        for command in commands:
+            if command[0] == 0:
+                line = {"id": next(self._ids), parent_field: parent_id}
+                self._store(line_model, line, command[2])
+                lines.append(line)
+            elif command[0] == 1:
+                for line in lines:
+                    if line["id"] == command[1]:
+                        self._store(line_model, line, command[2])
+            elif command[0] in (2, 3):
+                lines[:] = [line for line in lines if line["id"] != command[1]]
+            else:
+                raise xmlrpc.client.Fault(1, f"Unsupported command {command}")
+
+    def _create(self, model, args, kwargs):
+        values = args[0]
+        ids = []
+        for vals in values if isinstance(values, list) else [values]:
+            record = {"id": next(self._ids)}
+            if model in ("account.move", "purchase.order"):
+                record["state"] = "draft"
+            if model == "account.move":
+                record["amount_residual"] = 1.0
+            self.tables[model].append(record)
+            self._store(model, record, vals)
+            ids.append(record["id"])
+        return ids if isinstance(values, list) else ids[0]
+
+    def _write(self, model, args, kwargs):
+        ids, values = set(args[0]), args[1]
+        for record in self.tables[model]:
+            if record["id"] in ids:
+                self._store(model, record, values)
+        return True
+
+    def _action_post(self, model, args, kwargs):
+        ids = set(args[0])
+        for record in self.tables[model]:
+            if record["id"] in ids:
+                record["state"] = "posted"
+        return True
+
+
+def seed_reference_data(odoo):
+    """Seed the models every stream looks records up in."""
+    odoo.seed("res.currency", [{"id": 1, "name": "USD"}])
+    odoo.seed("res.country", [{"id": 233, "name": "United States", "code": "US"}])
+    odoo.seed(
+        "account.account", [{"id": 10, "name": "Expenses", "code": "600000"}]
+    )
+    odoo.seed(
+        "product.product",
+        [{"id": 100 + i, "name": f"Product {i}"} for i in range(50)],
+    )
@@ -0,0 +1,118 @@
+"""Tests the lookup indexes on a recorded session."""
+
+import threading
+
+from target_odoo_v3.cache import CountryIndex, LookupIndex
+from target_odoo_v3.store import ReferenceStore
+
+COUNTRIES = [
+    {"id": 233, "name": "United States", "code": "US"},
+    {"id": 77, "name": "United Kingdom", "code": "GB"},
+    {"id": 166, "name": "Netherlands", "code": "NL"},
+]
+
+
+class RecordingSession:
+    """Session answering `search_read` from a table, counting calls."""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+        self.store = None
+        self.lock = threading.RLock()
+        self.indexes = {}
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        self.calls.append((model, method, args))
+        records = self.records
+        for field, operator, value in args[0]:
+            if operator == ">=":
+                records = [r for r in records if r.get(field) >= value]
+            else:
+                assert operator == "in"
+                records = [r for r in records if r.get(field) in value]
+        return [dict(r) for r in records]
+
+
+def test_country_codes_and_names_match_case_insensitively():
+    session = RecordingSession(COUNTRIES)
+    countries = CountryIndex(session, "res.country")
+    assert countries.find("US")[0]["id"] == 233
+    assert countries.find("us")[0]["id"] == 233
+    assert countries.find("united  kingdom ")[0]["id"] == 77
+    assert countries.find("NETHERLANDS")[0]["id"] == 166
+    # The whole table is read once, every later lookup is served from memory.
+    assert len(session.calls) == 1
+
+
+def test_country_aliases():
+    session = RecordingSession(COUNTRIES)
+    countries = CountryIndex(session, "res.country")
+    assert countries.find("USA")[0]["code"] == "US"
+    assert countries.find("u.s.a.")[0]["code"] == "US"
+    assert countries.find("England")[0]["code"] == "GB"
+    assert countries.find("Holland")[0]["code"] == "NL"
+    # An alias of a country missing from Odoo matches nothing.
+    assert countries.find("Vietnam") == []
+    assert len(session.calls) == 1
+
+
+def test_unknown_countries_are_not_looked_up_again():
+    session = RecordingSession(COUNTRIES)
+    countries = CountryIndex(session, "res.country")
+    for _ in range(3):
+        assert countries.find("Atlantis") == []
+    assert len(session.calls) == 1
+    assert countries.hits > 0
+
+
+def test_lookup_misses_are_cached():
+    session = RecordingSession([{"id": 1, "name": "Acme"}])
+    partners = LookupIndex(session, "res.partner", fields=["id", "name"])
+    partners.prefetch("name", ["Acme", "Globex"])
+    assert len(session.calls) == 1
+    assert partners.get("name", "Acme")[0]["id"] == 1
+    assert partners.get("name", "Globex") == []
+    assert partners.get("name", "Globex") == []
+    assert len(session.calls) == 1
+    assert (partners.hits, partners.misses) == (3, 0)
+
+    # Records created later are added to the cached miss.
+    partners.add({"id": 2, "name": "Globex"})
+    assert partners.get("name", "Globex") == [{"id": 2, "name": "Globex"}]
+    assert len(session.calls) == 1
+
+
+def product(id, name, write_date="2024-01-01 00:00:00"):
+    return {"id": id, "name": name, "write_date": write_date}
+
+
+def test_stored_lookups_only_refresh_the_rows_a_batch_needs(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    products = [product(1, "A"), product(2, "B"), product(3, "C")]
+    session = RecordingSession(products)
+    session.store = ReferenceStore(path, "http://odoo", "db")
+    index = LookupIndex(session, "product.product", persist=True)
+    index.prefetch("name", ["A", "B", "C", "Missing"])
+    assert len(session.calls) == 1
+
+    # A later run, with products changed since all over the tenant.
+    changed = "2999-01-01 00:00:00"
+    products = [product(1, "A", changed), product(2, "B2", changed), product(3, "C")]
+    products += [product(id, f"Other {id}", changed) for id in range(4, 100)]
+    session = RecordingSession(products)
+    session.store = ReferenceStore(path, "http://odoo", "db")
+    index = LookupIndex(session, "product.product", persist=True)
+    index.prefetch("name", ["A", "B", "C"])
+    refresh = session.calls[0][2][0]
+    assert refresh[0][:2] == ["write_date", ">="]
+    assert refresh[1:] == [["id", "in", [1, 2, 3]]]
+    # B was renamed since, so it is looked up again.
+    assert session.calls[1][2][0] == [["name", "in", ["B"]]]
+    assert len(session.calls) == 2
+    assert index.get("name", "A")[0]["write_date"] == changed
+    assert index.get("name", "B") == []
+    assert index.get("name", "C")[0]["id"] == 3
+    # A stored miss is looked up again rather than trusted.
+    assert index.get("name", "Missing") == []
+    assert session.calls[2][2][0] == [["name", "in", ["Missing"]]]
@@ -1,14 +1,17 @@
 """Tests standard target features using the built-in SDK tests library."""
 
-import datetime
 from typing import Any, Dict
 
 from singer_sdk.testing import get_standard_target_tests
 
-from target_odoo_v2.target import TargetOdooV2
+from target_odoo_v3.target import TargetOdooV3
+from target_odoo_v3.tests import benchmark
 
 SAMPLE_CONFIG: Dict[str, Any] = {
-    # TODO: Initialize minimal target config
+    "url": "http://localhost:8069",
+    "db": "odoo",
+    "username": "admin",
+    "password": "admin",
 }
 
 
@@ -16,11 +19,21 @@ SAMPLE_CONFIG: Dict[str, Any] = {
 def test_standard_target_tests():
     """Run standard target tests from the SDK."""
     tests = get_standard_target_tests(
-        TargetOdooV2,
+        TargetOdooV3,
         config=SAMPLE_CONFIG,
     )
     for test in tests:
         test()
 
 
-# TODO: Create additional tests as appropriate for your target.
+def test_benchmark_against_fake_odoo():
+    """Replay a small synthetic run through the fake Odoo server."""
+    report = benchmark.run(
+        vendors=3, orders=3, bills=4, lines=2, config={"batch_size": 2}
+    )
+    assert report["records"] == 10
+    assert report["created"]["res.partner"] == 3
+    assert report["created"]["purchase.order"] == 3
+    assert report["created"]["account.move"] == 4
+    assert report["created"]["ir.attachment"] == 4
+    assert report["calls"]["account.move.action_post"] >= 1
@@ -0,0 +1,103 @@
+"""Tests the field and line diffs sent on updates."""
+
+from target_odoo_v3.diff import changed_fields, line_commands
+
+FIELDS = ["product_id", "name", "quantity", "price_unit", "tax_ids"]
+
+
+def line(id, product_id, name, quantity, price_unit=10.0, tax_ids=()):
+    """A move line as `search_read` returns it."""
+    return {
+        "id": id,
+        "product_id": [product_id, f"Product {product_id}"],
+        "name": name,
+        "quantity": quantity,
+        "price_unit": price_unit,
+        "tax_ids": list(tax_ids),
+    }
+
+
+def vals(product_id, name, quantity, price_unit=10.0, tax_ids=()):
+    """A mapped line payload."""
+    return {
+        "product_id": product_id,
+        "name": name,
+        "quantity": quantity,
+        "price_unit": price_unit,
+        "tax_ids": list(tax_ids),
+    }
+
+
+def test_unchanged_fields_are_dropped():
+    current = {
+        "id": 7,
+        "ref": "INV-1",
+        "partner_id": [5, "Acme"],
+        "invoice_date": "2024-01-15",
+        "invoice_date_due": False,
+        "amount": 10.000000001,
+        "tax_ids": [3, 1],
+    }
+    payload = {
+        "ref": "INV-1",
+        "partner_id": 5,
+        "invoice_date": "2024-01-15",
+        "invoice_date_due": None,
+        "amount": 10.0,
+        "tax_ids": [1, 3],
+    }
+    assert changed_fields(current, payload) == {}
+
+
+def test_changed_fields_are_write_ready():
+    current = {"partner_id": [5, "Acme"], "tax_ids": [1], "ref": "INV-1"}
+    payload = {"partner_id": 6, "tax_ids": [1, 2], "ref": "INV-1", "state": "draft"}
+    assert changed_fields(current, payload) == {
+        "partner_id": 6,
+        "tax_ids": [(6, 0, [1, 2])],
+        "state": "draft",
+    }
+    # Only the compared fields are sent.
+    assert changed_fields(current, payload, ["partner_id", "ref"]) == {
+        "partner_id": 6
+    }
+
+
+def test_unchanged_lines_produce_no_commands():
+    current = [line(11, 1, "A", 1), line(12, 2, "B", 2, tax_ids=[4])]
+    new = [vals(1, "A", 1), vals(2, "B", 2, tax_ids=[4])]
+    assert line_commands(current, new, FIELDS) == []
+
+
+def test_added_lines_are_created():
+    current = [line(11, 1, "A", 1)]
+    new = [vals(1, "A", 1), vals(2, "B", 2), vals(3, "C", 3)]
+    assert line_commands(current, new, FIELDS) == [
+        (0, 0, vals(2, "B", 2)),
+        (0, 0, vals(3, "C", 3)),
+    ]
+
+
+def test_removed_lines_are_deleted():
+    current = [line(11, 1, "A", 1), line(12, 2, "B", 2), line(13, 3, "C", 3)]
+    new = [vals(1, "A", 1)]
+    assert line_commands(current, new, FIELDS) == [(2, 12, 0), (2, 13, 0)]
+
+
+def test_changed_lines_send_only_their_changes():
+    current = [line(11, 1, "A", 1), line(12, 2, "B", 2)]
+    new = [vals(1, "A", 1), vals(2, "B", 5, price_unit=12.5)]
+    assert line_commands(current, new, FIELDS) == [
+        (1, 12, {"quantity": 5, "price_unit": 12.5})
+    ]
+
+
+def test_reordered_lines_are_updated_in_place():
+    # Lines are matched by position, so a reorder rewrites the swapped lines
+    # instead of deleting and recreating them.
+    current = [line(11, 1, "A", 1), line(12, 2, "B", 2), line(13, 3, "C", 3)]
+    new = [vals(2, "B", 2), vals(1, "A", 1), vals(3, "C", 3)]
+    assert line_commands(current, new, FIELDS) == [
+        (1, 11, {"product_id": 2, "name": "B", "quantity": 2}),
+        (1, 12, {"product_id": 1, "name": "A", "quantity": 1}),
+    ]
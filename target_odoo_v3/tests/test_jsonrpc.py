@@ -0,0 +1,89 @@
+"""Tests the JSON-RPC transport against the XML-RPC one."""
+
+import xmlrpc.client
+
+import pytest
+
+from target_odoo_v3.client import (
+    ACCESS_DENIED_FAULT_CODE,
+    JsonRpcClient,
+    OdooClient,
+    RetryPolicy,
+    jsonrpc_fault,
+)
+from target_odoo_v3.tests import benchmark
+from target_odoo_v3.tests.fake_odoo import FakeOdoo
+
+
+def test_error_payload_becomes_a_fault():
+    fault = jsonrpc_fault(
+        {
+            "code": 200,
+            "message": "Odoo Server Error",
+            "data": {
+                "name": "odoo.exceptions.ValidationError",
+                "message": "The partner is required",
+                "debug": "Traceback (most recent call last): ...",
+            },
+        }
+    )
+    assert isinstance(fault, xmlrpc.client.Fault)
+    assert fault.faultCode == 200
+    assert fault.faultString == (
+        "odoo.exceptions.ValidationError: The partner is required\n"
+        "Traceback (most recent call last): ..."
+    )
+
+
+def test_error_payload_without_data_keeps_its_message():
+    fault = jsonrpc_fault({"code": 100, "message": "Odoo Session Expired"})
+    assert (fault.faultCode, fault.faultString) == (100, "Odoo Session Expired")
+
+
+def test_access_denied_keeps_the_xmlrpc_fault_code():
+    fault = jsonrpc_fault(
+        {
+            "code": 200,
+            "message": "Odoo Server Error",
+            "data": {"name": "odoo.exceptions.AccessDenied", "message": "Access Denied"},
+        }
+    )
+    assert fault.faultCode == ACCESS_DENIED_FAULT_CODE
+
+
+@pytest.mark.parametrize("client_class", [OdooClient, JsonRpcClient])
+def test_server_errors_raise_the_same_fault(client_class):
+    with FakeOdoo() as odoo:
+        client = client_class(odoo.url, retry=RetryPolicy(0))
+        with pytest.raises(xmlrpc.client.Fault) as error:
+            client.execute_kw("db", 2, "pw", "res.partner", "unlink", [[1]])
+        client.close()
+    assert "Unknown method res.partner.unlink" in error.value.faultString
+
+
+@pytest.mark.parametrize("client_class", [OdooClient, JsonRpcClient])
+def test_results_are_the_same(client_class):
+    with FakeOdoo() as odoo:
+        odoo.seed("res.currency", [{"id": 1, "name": "USD"}, {"id": 2, "name": "EUR"}])
+        client = client_class(odoo.url, retry=RetryPolicy(0))
+        assert client.call("common", "authenticate", "db", "admin", "pw", {}) == 2
+        result = client.execute_kw(
+            "db",
+            2,
+            "pw",
+            "res.currency",
+            "search_read",
+            [[["name", "=", "EUR"]]],
+            {"fields": ["name"]},
+        )
+        client.close()
+    assert result == [{"id": 2, "name": "EUR"}]
+
+
+def test_jsonrpc_transport_makes_the_same_calls():
+    """A run over JSON-RPC sends the calls an XML-RPC run sends."""
+    settings = dict(vendors=3, orders=2, bills=3, lines=2, attachments=1)
+    xmlrpc_run = benchmark.run(config={"transport": "xmlrpc"}, **settings)
+    jsonrpc_run = benchmark.run(config={"transport": "jsonrpc"}, **settings)
+    assert jsonrpc_run["calls"] == xmlrpc_run["calls"]
+    assert jsonrpc_run["created"] == xmlrpc_run["created"]
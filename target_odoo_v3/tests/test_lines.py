@@ -0,0 +1,58 @@
+"""Tests incremental line item reading and chunking."""
+
+import json
+
+import pytest
+
+from target_odoo_v3.lines import chunked, iter_line_items
+
+ITEMS = [
+    {"productName": "Product 0", "quantity": 1, "unitPrice": 10.0},
+    {"productName": "A, [quoted] \"name\"", "quantity": 2, "unitPrice": None},
+    {"productName": "Product 2", "tags": [{"id": 1}, {"id": 2}], "quantity": 3},
+    {"productName": "Product 3", "quantity": 4, "unitPrice": 12.5},
+    {"productName": "Product 4", "quantity": 5, "unitPrice": 0},
+]
+
+
+@pytest.mark.parametrize("line_items", [None, [], "[]", " [ ] ", "\n[\n]\n"])
+def test_empty_line_items(line_items):
+    assert list(iter_line_items(line_items)) == []
+    assert list(chunked(iter_line_items(line_items), 2)) == []
+
+
+@pytest.mark.parametrize(
+    "line_items",
+    [
+        json.dumps(ITEMS),
+        json.dumps(ITEMS, indent=1),
+        json.dumps(ITEMS, separators=(",", ":")),
+        "\n " + json.dumps(ITEMS, indent="\t") + " \n",
+    ],
+)
+def test_json_line_items_are_decoded_one_by_one(line_items):
+    assert list(iter_line_items(line_items)) == ITEMS
+
+
+def test_decoded_items_match_across_chunk_boundaries():
+    chunks = list(chunked(iter_line_items(json.dumps(ITEMS, indent=2)), 2))
+    assert chunks == [ITEMS[0:2], ITEMS[2:4], ITEMS[4:]]
+
+
+def test_lists_are_passed_through():
+    assert list(iter_line_items(ITEMS)) == ITEMS
+
+
+@pytest.mark.parametrize(
+    "line_items",
+    ['{"productName": "Product 0"}', '[{"quantity": 1} {"quantity": 2}]', "[1, 2"],
+)
+def test_malformed_line_items_raise(line_items):
+    with pytest.raises(ValueError):
+        list(iter_line_items(line_items))
+
+
+def test_last_chunk_is_partial():
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunked(range(6), 3)) == [[0, 1, 2], [3, 4, 5]]
+    assert list(chunked(range(2), 3)) == [[0, 1]]
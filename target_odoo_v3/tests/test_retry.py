@@ -0,0 +1,187 @@
+"""Tests which Odoo errors are retried, how long for and the limiter."""
+
+import socket
+import xmlrpc.client
+
+import pytest
+
+from target_odoo_v3 import client
+from target_odoo_v3.attachments import Base64FileStream
+from target_odoo_v3.client import (
+    AdaptiveLimiter,
+    OdooClient,
+    RetryPolicy,
+    classify_error,
+)
+from target_odoo_v3.tests.fake_odoo import FakeOdoo, RequestHandler
+
+
+def protocol_error(status, headers=None):
+    return xmlrpc.client.ProtocolError(
+        "http://odoo/xmlrpc/2/object", status, "", headers or {}
+    )
+
+
+@pytest.mark.parametrize("status", [429, 503])
+@pytest.mark.parametrize("idempotent", [True, False])
+def test_rejected_requests_are_retried(status, idempotent):
+    assert classify_error(protocol_error(status), idempotent) == (True, True)
+
+
+@pytest.mark.parametrize("status", [502, 504])
+def test_gateway_errors_are_only_retried_on_reads(status):
+    assert classify_error(protocol_error(status), idempotent=True) == (True, True)
+    assert classify_error(protocol_error(status), idempotent=False) == (False, True)
+
+
+def test_other_errors():
+    assert classify_error(protocol_error(500), True) == (False, False)
+    assert classify_error(ConnectionRefusedError(), False) == (True, True)
+    assert classify_error(socket.timeout(), True) == (True, True)
+    assert classify_error(socket.timeout(), False) == (False, True)
+    assert classify_error(ConnectionResetError(), True) == (True, False)
+    assert classify_error(ConnectionResetError(), False) == (False, False)
+    assert classify_error(ValueError(), True) == (False, False)
+
+
+def test_only_conflict_faults_are_retried():
+    conflict = xmlrpc.client.Fault(1, "psycopg2 error: could not serialize access")
+    assert classify_error(conflict, idempotent=False) == (True, False)
+    invalid = xmlrpc.client.Fault(2, "ValidationError: missing partner")
+    assert classify_error(invalid, idempotent=True) == (False, False)
+
+
+def test_retry_after_is_honoured():
+    policy = RetryPolicy(max_retries=3, backoff=1.0, max_backoff=60.0)
+    assert policy.delay(0, protocol_error(503, {"Retry-After": "7"})) == 7.0
+    assert policy.delay(0, protocol_error(429, {"retry-after": "2.5"})) == 2.5
+    # Capped at the maximum backoff.
+    assert policy.delay(0, protocol_error(503, {"Retry-After": "3600"})) == 60.0
+
+
+def test_backoff_grows_with_full_jitter(monkeypatch):
+    policy = RetryPolicy(max_retries=3, backoff=1.0, max_backoff=5.0)
+    monkeypatch.setattr(client.random, "uniform", lambda low, high: high)
+    assert [policy.delay(attempt, socket.timeout()) for attempt in range(5)] == [
+        1.0,
+        2.0,
+        4.0,
+        5.0,
+        5.0,
+    ]
+    # A Retry-After that isn't a number of seconds falls back to backoff.
+    assert policy.delay(1, protocol_error(503, {"Retry-After": "soon"})) == 2.0
+
+
+def failing(*errors):
+    """Callable raising `errors` in turn, then returning "ok"."""
+    calls = []
+
+    def call():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return call, calls
+
+
+@pytest.fixture
+def odoo_client(monkeypatch):
+    monkeypatch.setattr(client.time, "sleep", lambda seconds: None)
+    return OdooClient("http://odoo", pool_size=4, retry=RetryPolicy(2, 0.0, 0.0))
+
+
+def test_rejected_create_is_sent_again(odoo_client):
+    call, calls = failing(protocol_error(503), protocol_error(429))
+    assert odoo_client._retrying(False, call) == "ok"
+    assert len(calls) == 3
+
+
+def test_gateway_timeout_on_create_is_not_sent_again(odoo_client):
+    call, calls = failing(protocol_error(504))
+    with pytest.raises(xmlrpc.client.ProtocolError):
+        odoo_client._retrying(False, call)
+    assert len(calls) == 1
+
+
+def test_gateway_timeout_on_read_is_sent_again(odoo_client):
+    call, calls = failing(protocol_error(504))
+    assert odoo_client._retrying(True, call) == "ok"
+    assert len(calls) == 2
+
+
+def test_retries_stop_at_max_retries(odoo_client):
+    call, calls = failing(*[protocol_error(503)] * 5)
+    with pytest.raises(xmlrpc.client.ProtocolError):
+        odoo_client._retrying(True, call)
+    assert len(calls) == 3
+
+
+def test_limiter_halves_under_pressure_and_recovers(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(client.time, "monotonic", lambda: now[0])
+    limiter = AdaptiveLimiter(8, cooldown=1.0)
+    limiter.pressure()
+    assert limiter.limit == 4
+    # A burst of rejected calls within the cooldown counts once.
+    limiter.pressure()
+    assert limiter.limit == 4
+    now[0] += 1.5
+    limiter.pressure()
+    assert limiter.limit == 2
+    now[0] += 1.5
+    limiter.pressure()
+    limiter.pressure()
+    now[0] += 1.5
+    limiter.pressure()
+    assert limiter.limit == 1
+
+    # Additive increase: about one more slot per `limit` successes.
+    limiter.success()
+    assert limiter.limit == 2
+    limiter.success()
+    limiter.success()
+    assert limiter.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(100):
+        limiter.success()
+    assert limiter.limit == 8
+
+
+def test_pressure_from_calls_lowers_the_limit(odoo_client):
+    call, _ = failing(protocol_error(503))
+    odoo_client._retrying(True, call)
+    # Halved from 4, then raised by the successful retry.
+    assert odoo_client.limiter.limit == 2.5
+
+
+def test_streamed_create_reconnects_a_closed_keep_alive_connection(
+    monkeypatch, tmp_path
+):
+    do_post = RequestHandler.do_POST
+
+    def do_post_and_close(self):
+        # The server drops idle connections without telling the client.
+        do_post(self)
+        self.close_connection = True
+
+    monkeypatch.setattr(RequestHandler, "do_POST", do_post_and_close)
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF" * 50000)
+    stream = Base64FileStream(str(path))
+    with FakeOdoo() as odoo:
+        odoo_client = OdooClient(odoo.url, pool_size=1, retry=RetryPolicy(0))
+        odoo_client.execute_kw("db", 2, "pw", "res.currency", "search_read", [[]])
+        attachment_id = odoo_client.execute_kw_streamed(
+            "db",
+            2,
+            "pw",
+            "ir.attachment",
+            "create",
+            [{"name": "scan.pdf", "datas": stream.placeholder}],
+            None,
+            stream,
+        )
+        odoo_client.close()
+    assert [a["id"] for a in odoo.tables["ir.attachment"]] == [attachment_id]
+    assert odoo.calls[("ir.attachment", "create")] == 1
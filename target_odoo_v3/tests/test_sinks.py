@@ -0,0 +1,416 @@
+"""Runs the sink paths end to end against the fake Odoo server."""
+
+import io
+import json
+import time
+import xmlrpc.client
+from contextlib import redirect_stdout
+
+import pytest
+
+from target_odoo_v3.client import OdooClient
+from target_odoo_v3.journal import CheckpointJournal
+from target_odoo_v3.sinks import Bills, Vendors
+from target_odoo_v3.target import TargetOdooV3
+from target_odoo_v3.tests.benchmark import (
+    bill_records,
+    order_records,
+    singer_messages,
+    vendor_records,
+    write_attachments,
+)
+from target_odoo_v3.tests.fake_odoo import FakeOdoo, seed_reference_data
+
+
+@pytest.fixture
+def odoo():
+    with FakeOdoo() as odoo:
+        seed_reference_data(odoo)
+        odoo.seed("res.partner", [{"id": 50, "name": "Vendor 0"}])
+        yield odoo
+
+
+def run_target(odoo, messages, **config):
+    """Run the target over `messages`, return its last state."""
+    target_config = {
+        "url": odoo.url,
+        "db": "test",
+        "username": "admin",
+        "password": "admin",
+        "max_retries": 0,
+    }
+    target_config.update(config)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        TargetOdooV3(config=target_config).listen(
+            io.StringIO("\n".join(json.dumps(m) for m in messages) + "\n")
+        )
+    states = [
+        json.loads(line)
+        for line in output.getvalue().splitlines()
+        if line.startswith('{"bookmarks"')
+    ]
+    return states[-1]
+
+
+def bills(count=1, lines=2, status="draft"):
+    records = list(bill_records(count, lines, vendors=1, attachments=0))
+    for record in records:
+        record["status"] = status
+    return records
+
+
+def fail_calls(odoo, model, method, times=None):
+    """Make `model.method` raise a Fault, the first `times` calls only."""
+    original = getattr(odoo, f"_{method}")
+    left = [times]
+
+    def failing(call_model, args, kwargs):
+        if call_model == model and left[0] != 0:
+            if left[0] is not None:
+                left[0] -= 1
+            raise xmlrpc.client.Fault(2, f"{model}.{method} failed")
+        return original(call_model, args, kwargs)
+
+    setattr(odoo, f"_{method}", failing)
+
+
+def seed_move(odoo, ref, state="draft", quantities=(1, 2)):
+    odoo.seed(
+        "account.move",
+        [
+            {
+                "ref": ref,
+                "move_type": "in_invoice",
+                "partner_id": 50,
+                "currency_id": 1,
+                "invoice_date": "2024-01-15",
+                "invoice_date_due": "2024-02-15",
+                "state": state,
+                "invoice_line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "product_id": 100 + index,
+                            "name": f"Product {index}",
+                            "quantity": quantity,
+                            "price_unit": 10.0,
+                            "discount": 0,
+                            "account_id": 10,
+                            "tax_ids": [],
+                        },
+                    )
+                    for index, quantity in enumerate(quantities)
+                ],
+            }
+        ],
+    )
+    return odoo.tables["account.move"][-1]["id"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 10])
+def test_upsert_by_ref_updates_changed_lines_only(odoo, batch_size):
+    move_id = seed_move(odoo, "BILL000000", quantities=(1, 5))
+    records = bills(2)
+    state = run_target(
+        odoo,
+        singer_messages({"Bills": records}),
+        upsert_by_ref=True,
+        batch_size=batch_size,
+    )
+    assert state["summary"]["Bills"] == {
+        "success": 1,
+        "fail": 0,
+        "existing": 0,
+        "updated": 1,
+    }
+    assert odoo.calls[("account.move", "write")] == 1
+    lines = [
+        line for line in odoo.tables["account.move.line"] if line["move_id"] == move_id
+    ]
+    assert [line["quantity"] for line in lines] == [1, 2]
+    # BILL000001 had no move yet.
+    assert len(odoo.tables["account.move"]) == 2
+
+
+def test_upsert_by_ref_leaves_up_to_date_moves_alone(odoo):
+    seed_move(odoo, "BILL000000")
+    state = run_target(odoo, singer_messages({"Bills": bills()}), upsert_by_ref=True)
+    assert state["summary"]["Bills"]["existing"] == 1
+    assert odoo.calls[("account.move", "write")] == 0
+    assert odoo.calls[("account.move", "create")] == 0
+
+
+@pytest.mark.parametrize("upsert_by_ref", [False, True])
+def test_ids_of_moves_of_another_type_are_not_updated(odoo, upsert_by_ref):
+    odoo.seed(
+        "account.move",
+        [{"id": 7, "ref": "INV-7", "move_type": "out_invoice", "partner_id": 50}],
+    )
+    invoice = dict(odoo.tables["account.move"][0])
+    bill_id = seed_move(odoo, "BILL000000", quantities=(1, 5))
+    records = bills()
+    records[0]["id"] = 7
+    state = run_target(
+        odoo, singer_messages({"Bills": records}), upsert_by_ref=upsert_by_ref
+    )
+    assert odoo.tables["account.move"][0] == invoice
+    if upsert_by_ref:
+        # Matched by ref instead.
+        assert state["summary"]["Bills"]["updated"] == 1
+        assert state["bookmarks"]["Bills"][0]["id"] == bill_id
+        assert len(odoo.tables["account.move"]) == 2
+    else:
+        assert state["summary"]["Bills"]["success"] == 1
+        assert len(odoo.tables["account.move"]) == 3
+
+
+def test_verify_ref_skips_existing_moves(odoo):
+    move_id = seed_move(odoo, "BILL000000")
+    state = run_target(
+        odoo, singer_messages({"Bills": bills(2)}), verify_ref=True, batch_size=10
+    )
+    assert state["summary"]["Bills"]["existing"] == 1
+    assert state["summary"]["Bills"]["success"] == 1
+    assert odoo.calls[("account.move", "create")] == 1
+    assert odoo.calls[("account.move", "write")] == 0
+    assert move_id in [m["id"] for m in odoo.tables["account.move"]]
+
+
+def test_failed_ref_lookup_falls_back_to_each_record(odoo):
+    fail_calls(odoo, "account.move", "search_read", times=1)
+    state = run_target(
+        odoo, singer_messages({"Bills": bills(3)}), verify_ref=True, batch_size=10
+    )
+    assert state["summary"]["Bills"]["success"] == 3
+    assert len(odoo.tables["account.move"]) == 3
+
+
+def test_failing_lookup_fails_the_record_not_the_run(odoo):
+    fail_calls(odoo, "res.partner", "search_read")
+    messages = list(singer_messages({"Vendors": list(vendor_records(2))}))
+    messages += list(singer_messages({"Bills": bills(2)}))
+    state = run_target(odoo, messages)
+    assert state["summary"]["Vendors"]["fail"] == 2
+    assert state["summary"]["Bills"]["fail"] == 2
+    assert "search_read failed" in state["bookmarks"]["Bills"][0]["error"]
+
+
+def test_failed_bulk_create_falls_back_to_one_create_per_record(odoo):
+    original = odoo._create
+
+    def create(model, args, kwargs):
+        if model == "account.move" and isinstance(args[0], list):
+            raise xmlrpc.client.Fault(2, "batch rejected")
+        return original(model, args, kwargs)
+
+    odoo._create = create
+    state = run_target(odoo, singer_messages({"Bills": bills(3)}), batch_size=10)
+    assert state["summary"]["Bills"]["success"] == 3
+    assert odoo.calls[("account.move", "create")] == 4
+
+
+def test_bulk_create_with_unknown_outcome_is_not_sent_again(odoo):
+    original = odoo._create
+
+    def create(model, args, kwargs):
+        ids = original(model, args, kwargs)
+        if model == "account.move" and isinstance(args[0], list):
+            # Committed, but answered after the client gave up.
+            time.sleep(1)
+        return ids
+
+    odoo._create = create
+    state = run_target(
+        odoo, singer_messages({"Bills": bills(3)}), batch_size=10, request_timeout=0.2
+    )
+    assert len(odoo.tables["account.move"]) == 3
+    assert odoo.calls[("account.move", "create")] == 1
+    assert state["summary"]["Bills"]["fail"] == 3
+    assert "unknown outcome" in state["bookmarks"]["Bills"][0]["error"]
+
+
+@pytest.mark.parametrize("max_age_drain", [False, True])
+def test_bills_are_flushed_after_the_vendors_they_reference(
+    odoo, monkeypatch, max_age_drain
+):
+    vendors = list(vendor_records(3))
+    records = list(bill_records(3, 1, vendors=3, attachments=0))
+    vendor_messages = list(singer_messages({"Vendors": vendors}))
+    bill_messages = list(singer_messages({"Bills": records}))
+    # A schema of each stream, then vendors and bills interleaved.
+    messages = [vendor_messages[0], bill_messages[0]]
+    for vendor, bill in zip(vendor_messages[1:], bill_messages[1:]):
+        messages += [vendor, bill]
+    if max_age_drain:
+        # A state message past the max record age drains every sink mid-run.
+        monkeypatch.setattr(TargetOdooV3, "_MAX_RECORD_AGE_IN_MINUTES", -1.0)
+        messages.append({"type": "STATE", "value": {"bookmarks": {}}})
+
+    # Sinks are drained on parallel threads. Bills start a little late so
+    # the vendors drain thread has already taken its buffer, and the slow
+    # vendor flush must still finish before bills are mapped.
+    process_vendors = Vendors.process_batch_records
+
+    def slow_process_vendors(self, items):
+        time.sleep(0.3)
+        return process_vendors(self, items)
+
+    monkeypatch.setattr(Vendors, "process_batch_records", slow_process_vendors)
+    flush_references = Bills.flush_references
+
+    def late_flush_references(self):
+        time.sleep(0.1)
+        flush_references(self)
+
+    monkeypatch.setattr(Bills, "flush_references", late_flush_references)
+    run_target(odoo, messages, batch_size=10)
+    names = {p["id"]: p["name"] for p in odoo.tables["res.partner"]}
+    assert [names.get(m.get("partner_id")) for m in odoo.tables["account.move"]] == [
+        f"Vendor {i}" for i in range(3)
+    ]
+
+
+def test_checkpointed_moves_are_not_created_again(odoo, tmp_path):
+    path = str(tmp_path / "checkpoints.jsonl")
+    records = bills(2, status="posted")
+    first = run_target(odoo, singer_messages({"Bills": records}), checkpoint_path=path)
+    assert first["summary"]["Bills"]["success"] == 2
+    assert {e["stage"] for e in CheckpointJournal(path)._entries.values()} == {
+        "posted"
+    }
+
+    # Another path than the first run so the journal is read from disk again.
+    copy = tmp_path / "copy.jsonl"
+    copy.write_text((tmp_path / "checkpoints.jsonl").read_text())
+    creates = odoo.calls[("account.move", "create")]
+    second = run_target(
+        odoo, singer_messages({"Bills": records}), checkpoint_path=str(copy)
+    )
+    assert second["summary"]["Bills"]["existing"] == 2
+    assert odoo.calls[("account.move", "create")] == creates
+    assert len(odoo.tables["account.move"]) == 2
+
+
+def test_interrupted_moves_resume_at_their_stage(odoo, tmp_path):
+    records = list(bill_records(1, 2, vendors=1, attachments=1))
+    records[0]["status"] = "posted"
+    write_attachments(str(tmp_path), records, 16)
+    move_id = seed_move(odoo, "BILL000000")
+    path = tmp_path / "checkpoints.jsonl"
+    path.write_text(
+        json.dumps({"key": "Bills|Vendor 0|BILL000000", "id": move_id, "stage": "lines"})
+        + "\n"
+    )
+    state = run_target(
+        odoo,
+        singer_messages({"Bills": records}),
+        checkpoint_path=str(path),
+        input_path=str(tmp_path),
+    )
+    assert state["summary"]["Bills"]["success"] == 1
+    assert odoo.calls[("account.move", "create")] == 0
+    assert [a["res_id"] for a in odoo.tables["ir.attachment"]] == [move_id]
+    assert odoo.tables["account.move"][-1]["state"] == "posted"
+    assert CheckpointJournal(str(path)).get("Bills|Vendor 0|BILL000000")[
+        "stage"
+    ] == "posted"
+
+
+def test_interrupted_chunked_create_appends_the_remaining_lines(odoo, tmp_path):
+    move_id = seed_move(odoo, "BILL000000", quantities=(1, 2))
+    path = tmp_path / "checkpoints.jsonl"
+    path.write_text(
+        json.dumps(
+            {"key": "Bills|Vendor 0|BILL000000", "id": move_id, "stage": "created"}
+        )
+        + "\n"
+    )
+    state = run_target(
+        odoo,
+        singer_messages({"Bills": bills(1, lines=5)}),
+        checkpoint_path=str(path),
+        line_chunk_size=2,
+    )
+    assert state["summary"]["Bills"]["success"] == 1
+    assert odoo.calls[("account.move", "create")] == 0
+    lines = odoo.tables["account.move.line"]
+    assert [line["move_id"] for line in lines] == [move_id] * 5
+    assert [line["quantity"] for line in lines] == [1, 2, 3, 4, 5]
+
+
+def test_failed_upload_keeps_the_attachments_stage_open(odoo, tmp_path):
+    records = list(bill_records(1, 1, vendors=1, attachments=1))
+    write_attachments(str(tmp_path), records, 16)
+    path = str(tmp_path / "checkpoints.jsonl")
+    fail_calls(odoo, "ir.attachment", "create", times=1)
+    run_target(
+        odoo,
+        singer_messages({"Bills": records}),
+        checkpoint_path=path,
+        input_path=str(tmp_path),
+    )
+    assert CheckpointJournal(path).get("Bills|Vendor 0|BILL000000")["stage"] == "lines"
+
+    copy = tmp_path / "copy.jsonl"
+    copy.write_text((tmp_path / "checkpoints.jsonl").read_text())
+    run_target(
+        odoo,
+        singer_messages({"Bills": records}),
+        checkpoint_path=str(copy),
+        input_path=str(tmp_path),
+    )
+    assert len(odoo.tables["account.move"]) == 1
+    assert len(odoo.tables["ir.attachment"]) == 1
+    journal = CheckpointJournal(str(copy))
+    assert journal.get("Bills|Vendor 0|BILL000000")["stage"] == "attachments"
+
+
+def test_dry_run_does_not_plan_payment_writes(odoo, tmp_path):
+    fixtures = tmp_path / "fixtures.json"
+    fixtures.write_text(json.dumps(odoo.tables))
+    plan = tmp_path / "plan.jsonl"
+    state = run_target(
+        odoo,
+        singer_messages({"Bills": bills(2, status="posted")}),
+        dry_run=True,
+        dry_run_plan=str(plan),
+        dry_run_fixtures=str(fixtures),
+    )
+    assert state["summary"]["Bills"]["success"] == 2
+    calls = [json.loads(line) for line in plan.read_text().splitlines()]
+    assert [call["method"] for call in calls] == ["create", "action_post"] * 2
+    assert odoo.calls[("account.move", "create")] == 0
+
+
+def test_upload_transport_error_does_not_fail_the_move(odoo, monkeypatch, tmp_path):
+    def broken_pipe(*args):
+        raise BrokenPipeError(32, "Broken pipe")
+
+    monkeypatch.setattr(OdooClient, "_execute_kw_streamed", broken_pipe)
+    records = list(bill_records(1, 1, vendors=1, attachments=1))
+    write_attachments(str(tmp_path), records, 16)
+    path = str(tmp_path / "checkpoints.jsonl")
+    state = run_target(
+        odoo,
+        singer_messages({"Bills": records}),
+        checkpoint_path=path,
+        input_path=str(tmp_path),
+    )
+    assert state["summary"]["Bills"]["success"] == 1
+    assert len(odoo.tables["account.move"]) == 1
+    assert odoo.tables["ir.attachment"] == []
+    assert CheckpointJournal(path).get("Bills|Vendor 0|BILL000000")["stage"] == "lines"
+
+
+def test_buy_order_suppliers_are_prefetched_once_per_batch(odoo):
+    odoo.seed("res.partner", [{"name": f"Vendor {i}"} for i in range(1, 4)])
+    orders = list(order_records(8, 2, vendors=4))
+    state = run_target(odoo, singer_messages({"BuyOrders": orders}), batch_size=10)
+    assert state["summary"]["BuyOrders"]["success"] == 8
+    assert odoo.calls[("res.partner", "search_read")] == 1
+    names = {p["id"]: p["name"] for p in odoo.tables["res.partner"]}
+    assert [names[o["partner_id"]] for o in odoo.tables["purchase.order"]] == [
+        f"Vendor {i % 4}" for i in range(8)
+    ]